@@ -3,8 +3,20 @@ import random
 import sys
 from PIL import Image
 import numpy as np
+from sprite_bake import pixelate_rgba
 import math
 import os
+import argparse
+import base64
+import gc
+import gzip
+import json
+import queue
+import struct
+import threading
+import time
+import tracemalloc
+from collections import deque, namedtuple
 
 # Font selection: prioritize system fonts that support Chinese characters
 def get_cjk_font(size, bold=False, italic=False):
@@ -150,6 +162,9 @@ class SoundEffectManager:
                 print("bullet_change.mp3 or bullet_change.wav not found")
         except Exception as e:
             print(f"Failed to load sound effects: {e}")
+        # Outside the try: the "fail" budget policy must not be swallowed as a load error
+        ASSET_MEMORY.register("shoot sound", self.shoot_sound)
+        ASSET_MEMORY.register("bullet_change sound", self.transition_sound)
     
     def play_shoot(self):
         """Play shoot sound effect"""
@@ -171,6 +186,865 @@ class SoundEffectManager:
         except Exception as e:
             print(f"Failed to play transition sound: {e}")
 
+
+# Telemetry writer
+class TelemetryWriter:
+    """Buffers shot/round records in memory and writes them from a background thread"""
+    def __init__(self, output_dir="telemetry", queue_size=4096, batch_size=256,
+                 flush_interval=1.0, rotate_records=50000, policy="drop_newest"):
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval  # seconds between forced flushes
+        self.rotate_records = rotate_records  # records per file before rotating
+        self.policy = policy  # "drop_newest", "drop_oldest" or "block"
+        self.session_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.file = None
+        self.file_index = 0
+        self.file_records = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, kind, **fields):
+        """Queue one record; never does file I/O on the calling thread"""
+        if self.closed:
+            return
+        fields["type"] = kind
+        fields["session"] = self.session_id
+        fields["t"] = time.time()
+        try:
+            self.queue.put_nowait(fields)
+            return
+        except queue.Full:
+            pass
+
+        # Queue full: apply backpressure policy
+        if self.policy == "block":
+            try:
+                self.queue.put(fields, timeout=0.05)
+                return
+            except queue.Full:
+                pass
+        elif self.policy == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+                self.queue.put_nowait(fields)
+                return
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += 1
+
+    def close(self, timeout=5.0):
+        """Flush queued records and stop the writer thread"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)  # sentinel, blocks until there is room
+        self.thread.join(timeout)
+        if self.dropped:
+            print(f"Telemetry: dropped {self.dropped} records (queue full)")
+
+    def _open_next_file(self):
+        """Rotate to a new compressed JSONL file"""
+        if self.file is not None:
+            self.file.close()
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.file_index += 1
+        path = os.path.join(self.output_dir, f"session-{self.session_id}-{self.file_index:03d}.jsonl.gz")
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.file_records = 0
+
+    def _write_batch(self, batch):
+        """Write a batch of records, rotating files as needed"""
+        try:
+            for rec in batch:
+                if self.file is None or self.file_records >= self.rotate_records:
+                    self._open_next_file()
+                self.file.write(json.dumps(rec, separators=(",", ":")))
+                self.file.write("\n")
+                self.file_records += 1
+            self.file.flush()
+            self.written += len(batch)
+        except Exception as e:
+            print(f"Failed to write telemetry: {e}")
+
+    def _run(self):
+        """Writer thread: collect records into batches and write them"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                rec = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                rec = False  # timed out, flush what we have
+
+            if rec is None:
+                break
+            if rec:
+                batch.append(rec)
+            expired = time.monotonic() >= deadline
+            if batch and (len(batch) >= self.batch_size or expired):
+                self._write_batch(batch)
+                batch = []
+            if expired:
+                deadline = time.monotonic() + self.flush_interval
+
+        if batch:
+            self._write_batch(batch)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# Asset memory accounting
+class AssetMemoryTracker:
+    """Tracks byte size of loaded surfaces, arrays and sounds, with an optional budget"""
+    def __init__(self, budget=None, policy="log", use_tracemalloc=False):
+        self.budget = budget  # bytes, None for unlimited
+        self.policy = policy  # "log" or "fail"
+        self.assets = {}  # name -> (kind, bytes, format)
+        self.transitions = []  # (label, current, peak, top allocation lines)
+        self.last_snapshot = None
+        self.use_tracemalloc = use_tracemalloc
+        if use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @staticmethod
+    def measure(obj):
+        """Return (kind, bytes, format) for a surface, NumPy array or Sound"""
+        if isinstance(obj, pygame.Surface):
+            fmt = f"{obj.get_bitsize()}-bit"
+            if obj.get_flags() & pygame.SRCALPHA:
+                fmt += " SRCALPHA"
+            if obj.get_colorkey() is not None:
+                fmt += " colorkey"
+            if obj.get_parent() is not None:
+                # Subsurfaces share their parent's pixels
+                return "subsurface", 0, fmt
+            return "surface", obj.get_pitch() * obj.get_height(), fmt
+        if isinstance(obj, np.ndarray):
+            return "array", obj.nbytes, f"{obj.dtype} {'x'.join(map(str, obj.shape))}"
+        if AUDIO_ENABLED and isinstance(obj, pygame.mixer.Sound):
+            freq, size, channels = pygame.mixer.get_init()
+            nbytes = int(obj.get_length() * freq) * channels * (abs(size) // 8)
+            return "sound", nbytes, f"{freq}Hz {abs(size)}-bit {channels}ch"
+        return type(obj).__name__, 0, "?"
+
+    def total(self):
+        """Total bytes of all registered assets"""
+        return sum(nbytes for _, nbytes, _ in self.assets.values())
+
+    def register(self, name, obj):
+        """Account for a loaded asset, enforcing the budget"""
+        if obj is None:
+            return obj
+        kind, nbytes, fmt = self.measure(obj)
+        previous = self.assets.get(name, (None, 0, None))[1]
+        new_total = self.total() - previous + nbytes
+        if self.budget is not None and new_total > self.budget:
+            msg = (f"Asset memory budget exceeded loading {name}: "
+                   f"{new_total / 1024:.1f} KiB > {self.budget / 1024:.1f} KiB")
+            if self.policy == "fail":
+                raise MemoryError(msg)
+            print(msg)
+        self.assets[name] = (kind, nbytes, fmt)
+        return obj
+
+    def release(self, name):
+        """Stop accounting for an asset that was freed"""
+        self.assets.pop(name, None)
+
+    def snapshot(self, label):
+        """Record tracemalloc usage at a state transition"""
+        if not self.use_tracemalloc:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        snap = tracemalloc.take_snapshot()
+        top = []
+        if self.last_snapshot is not None:
+            for stat in snap.compare_to(self.last_snapshot, "lineno")[:3]:
+                top.append(str(stat))
+        self.transitions.append((label, current, peak, top))
+        self.last_snapshot = snap
+        tracemalloc.reset_peak()
+
+    def report(self):
+        """Return the memory report as a list of lines"""
+        lines = ["Asset memory report:"]
+        for name, (kind, nbytes, fmt) in sorted(self.assets.items(), key=lambda a: -a[1][1]):
+            lines.append(f"  {name:<28} {kind:<10} {nbytes / 1024:>10.1f} KiB  {fmt}")
+        total = self.total()
+        budget = f" / budget {self.budget / 1024:.1f} KiB" if self.budget is not None else ""
+        lines.append(f"  {'TOTAL':<28} {'':<10} {total / 1024:>10.1f} KiB{budget}")
+        if self.transitions:
+            lines.append("Python heap at state transitions (tracemalloc):")
+            for label, current, peak, top in self.transitions:
+                lines.append(f"  {label:<28} current {current / 1024:>9.1f} KiB  peak {peak / 1024:>9.1f} KiB")
+                for stat in top:
+                    lines.append(f"      {stat}")
+        return lines
+
+
+# Frame pacing
+class FramePacer:
+    """Paces frames (hybrid sleep+spin, vsync or uncapped) and measures frame-time jitter"""
+    MODES = ("hybrid", "vsync", "uncapped")
+
+    def __init__(self, fps, mode="hybrid", window=120, late_tolerance=0.2, fallback_ratio=0.1):
+        if mode not in self.MODES:
+            print(f"Unknown pacing mode {mode!r}, using hybrid")
+            mode = "hybrid"
+        self.target = 1.0 / fps
+        self.mode = mode
+        self.mode_changed = False
+        self.window = window  # frames per adaptation window
+        self.late_tolerance = late_tolerance  # fraction of target before a frame counts as late
+        self.fallback_ratio = fallback_ratio  # late fraction that triggers adaptation
+        self.spin_margin = 0.002  # seconds spun (instead of slept) before each deadline
+        self.refresh_frames = 30  # vsync frames measured before trusting the refresh rate
+        self.refresh_tolerance = 0.05  # vsync refresh must be within 5% of fps
+        self.frame_times = deque(maxlen=window)
+        self.recent_late = deque(maxlen=window)
+        self.recent_overslept = deque(maxlen=window)  # late because sleep woke up after the deadline
+        self.frames = 0
+        self.late_frames = 0
+        self.last = time.perf_counter()
+        self.deadline = self.last + self.target
+
+    def set_mode(self, mode):
+        """Switch pacing mode and restart the measurement window"""
+        if mode == self.mode:
+            return
+        print(f"Frame pacing: {self.mode} -> {mode}")
+        self.mode = mode
+        self.mode_changed = True
+        self.frame_times.clear()
+        self.recent_late.clear()
+        self.recent_overslept.clear()
+        self.deadline = time.perf_counter() + self.target
+
+    def resync(self):
+        """Restart frame timing after the loop blocked (e.g. waiting for input)"""
+        self.last = time.perf_counter()
+        self.deadline = self.last + self.target
+
+    def tick(self):
+        """Wait for the next frame deadline; return the last frame time in seconds"""
+        overslept = False
+        if self.mode == "hybrid":
+            # Coarse OS sleep until shortly before the deadline, then spin
+            remaining = self.deadline - time.perf_counter()
+            if remaining > self.spin_margin:
+                time.sleep(remaining - self.spin_margin)
+                overshoot = time.perf_counter() - (self.deadline - self.spin_margin)
+                overslept = overshoot > self.spin_margin
+                if overslept:
+                    # Sleep woke up too late, spin for longer next time
+                    self.spin_margin = min(self.target, max(overshoot, self.spin_margin * 1.5))
+                elif overshoot < self.spin_margin * 0.5:
+                    # Sleep is accurate, slowly give the CPU back
+                    self.spin_margin = max(0.001, self.spin_margin * 0.99)
+            while time.perf_counter() < self.deadline:
+                pass
+
+        now = time.perf_counter()
+        frame_time = now - self.last
+        self.last = now
+        self.deadline += self.target
+        if now > self.deadline:
+            # Fell behind by more than a frame, resync instead of bursting
+            self.deadline = now + self.target
+
+        late = frame_time > self.target * (1 + self.late_tolerance)
+        self.frames += 1
+        self.late_frames += late
+        self.frame_times.append(frame_time)
+        self.recent_late.append(late)
+        self.recent_overslept.append(late and overslept)
+        self.adapt()
+        return frame_time
+
+    def adapt(self):
+        """Change pacing strategy when deadlines keep being missed.
+
+        Only vsync falls back (to hybrid), also as soon as the display turns out
+        not to refresh at the target rate: the game advances one tick per frame,
+        so at 75 or 120 Hz it would run 1.25x or 2x too fast. Hybrid frames that
+        are late because update and draw ran over budget cannot be fixed by
+        pacing, so hybrid and uncapped keep their mode; hybrid only spins longer
+        when sleep oversleeps.
+        """
+        if self.mode == "vsync" and len(self.frame_times) >= self.refresh_frames:
+            refresh = float(np.median(self.frame_times))
+            if abs(refresh - self.target) > self.target * self.refresh_tolerance:
+                print(f"Frame pacing: display refreshes at {1.0 / refresh:.1f} Hz, "
+                      f"not {1.0 / self.target:.0f} Hz")
+                self.set_mode("hybrid")
+                return
+        if self.mode == "uncapped" or len(self.recent_late) < self.window:
+            return
+        late_ratio = sum(self.recent_late) / len(self.recent_late)
+        if self.mode == "vsync":
+            # Missing deadlines (a flip that does not block at all is caught above)
+            if late_ratio > self.fallback_ratio:
+                self.set_mode("hybrid")
+        elif self.mode == "hybrid" and self.spin_margin < self.target:
+            oversleep_ratio = sum(self.recent_overslept) / len(self.recent_overslept)
+            if oversleep_ratio > self.fallback_ratio:
+                # Still oversleeping past deadlines: trust sleep less and spin more
+                self.spin_margin = min(self.target, self.spin_margin * 2)
+                print(f"Frame pacing: spin margin raised to {self.spin_margin * 1000:.1f} ms")
+                self.recent_late.clear()
+                self.recent_overslept.clear()
+
+    def stats(self):
+        """Return frame time statistics over the recent window"""
+        if not self.frame_times:
+            return {'mode': self.mode, 'frames': 0, 'late': 0}
+        times = np.array(self.frame_times) * 1000.0
+        return {
+            'mode': self.mode,
+            'frames': self.frames,
+            'late': self.late_frames,
+            'mean_ms': float(times.mean()),
+            'stdev_ms': float(times.std()),
+            'max_ms': float(times.max()),
+            'fps': 1000.0 / float(times.mean()),
+        }
+
+
+# CPU use per game state
+class CpuMonitor:
+    """Accumulates wall and process CPU time per game state"""
+    def __init__(self):
+        self.totals = {}  # state name -> [wall seconds, cpu seconds]
+        self.last_wall = time.perf_counter()
+        self.last_cpu = time.process_time()
+
+    def sample(self, state_name):
+        """Charge the time since the last sample to state_name"""
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        totals = self.totals.setdefault(state_name, [0.0, 0.0])
+        totals[0] += wall - self.last_wall
+        totals[1] += cpu - self.last_cpu
+        self.last_wall = wall
+        self.last_cpu = cpu
+
+    def report(self):
+        """Return CPU use per state as a list of lines"""
+        lines = ["CPU use per state:"]
+        for name, (wall, cpu) in self.totals.items():
+            percent = 100.0 * cpu / wall if wall > 0 else 0.0
+            lines.append(f"  {name:<10} {wall:>8.1f} s wall  {cpu:>8.2f} s CPU  {percent:>5.1f}%")
+        return lines
+
+
+# Garbage collector control
+class GcController:
+    """Freezes long-lived assets and moves cyclic GC out of gameplay frames.
+
+    Automatic collection is disabled during gameplay; young generations are
+    collected when a frame finishes early and everything at state transitions.
+    """
+    def __init__(self, enabled, slack_ms=4.0, backlog_limit=20):
+        self.enabled = enabled
+        self.slack = slack_ms / 1000.0  # min time left in the frame to collect
+        self.backlog_limit = backlog_limit  # collect anyway past this many thresholds
+        self.state_name = None
+        self.pauses = {}  # state name -> [collections, total seconds, max seconds]
+        self.started = None
+        gc.callbacks.append(self._on_gc)
+
+    def _on_gc(self, phase, info):
+        """gc callback: time every collection, automatic or explicit"""
+        if phase == "start":
+            self.started = time.perf_counter()
+        elif self.started is not None:
+            pause = time.perf_counter() - self.started
+            totals = self.pauses.setdefault(self.state_name, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += pause
+            totals[2] = max(totals[2], pause)
+            self.started = None
+
+    def freeze(self):
+        """Move everything alive now (loaded assets) out of future collections"""
+        if self.enabled:
+            gc.collect()
+            gc.freeze()
+
+    def on_state(self, state):
+        """Collect at a state transition; automatic GC is off during gameplay"""
+        self.state_name = STATE_NAMES[state]
+        if not self.enabled:
+            return
+        gc.collect()
+        if state == STATE_GAMEPLAY:
+            gc.disable()
+        else:
+            gc.enable()
+
+    def collect_in_slack(self, remaining):
+        """Run due young-generation collections if the frame has time left"""
+        if not self.enabled or gc.isenabled():
+            return
+        count0, count1, _ = gc.get_count()
+        threshold0, threshold1, _ = gc.get_threshold()
+        if count0 < threshold0:
+            return
+        if remaining < self.slack and count0 < threshold0 * self.backlog_limit:
+            return
+        gc.collect(1 if count1 >= threshold1 else 0)
+
+    def report(self):
+        """Return GC pauses per state as a list of lines"""
+        lines = [f"GC pauses per state (frozen objects: {gc.get_freeze_count()}):"]
+        for name, (count, total, longest) in self.pauses.items():
+            lines.append(f"  {name or 'startup':<10} {count:>6} collections  "
+                         f"{total * 1000:>8.2f} ms total  {longest * 1000:>6.2f} ms max")
+        return lines
+
+
+# Per-frame allocation audit
+class AllocationAudit:
+    """Uses tracemalloc to find the call sites that allocate most per frame.
+
+    Traces are cleared at the start of each frame, so the snapshot at the end
+    holds only blocks allocated during the frame and still alive, which is
+    what the cyclic GC has to track. Clearing traces also invalidates the
+    MEMORY_TRACEMALLOC transition snapshots, so use one or the other.
+    """
+    def __init__(self, top=15):
+        self.top = top
+        self.frames = 0
+        self.sites = {}  # "file:line" -> [bytes, blocks]
+        self.peaks = []  # per-frame peak of newly allocated bytes
+        self.filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                        tracemalloc.Filter(False, "<frozen *>")]
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def begin_frame(self):
+        """Forget allocations made before this frame"""
+        tracemalloc.clear_traces()
+
+    def end_frame(self):
+        """Charge blocks allocated during this frame to their call sites"""
+        snap = tracemalloc.take_snapshot().filter_traces(self.filters)
+        for stat in snap.statistics("lineno"):
+            site = self.sites.setdefault(str(stat.traceback[0]), [0, 0])
+            site[0] += stat.size
+            site[1] += stat.count
+        self.peaks.append(tracemalloc.get_traced_memory()[1])
+        self.frames += 1
+
+    def report(self):
+        """Return the top allocating call sites as a list of lines"""
+        if not self.frames:
+            return ["Allocation audit: no frames recorded"]
+        peaks = np.array(self.peaks) / 1024.0
+        lines = [f"Allocation audit over {self.frames} frames "
+                 f"(peak new heap per frame: mean {peaks.mean():.1f} KiB, max {peaks.max():.1f} KiB):"]
+        ranked = sorted(self.sites.items(), key=lambda s: -s[1][0])[:self.top]
+        for site, (nbytes, blocks) in ranked:
+            lines.append(f"  {nbytes / self.frames:>10.1f} B/frame  {blocks / self.frames:>7.1f} blocks/frame  {site}")
+        return lines
+
+
+# Gameplay capture
+class FrameCapture:
+    """Copies frames into preallocated buffers and encodes them on a background thread.
+
+    Formats: "png" (numbered files in a directory), "y4m" (YUV 4:4:4 stream) or
+    "raw" (rgb24 stream). Frames are numbered by the capture itself. In live play a
+    frame is dropped and counted when no buffer is free; offline (replays) capture
+    waits for the encoder instead.
+    """
+    FORMATS = ("png", "y4m", "raw")
+
+    def __init__(self, path, fmt="png", size=(800, 600), fps=60, buffers=8):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown capture format {fmt!r}")
+        self.path = path
+        self.fmt = fmt
+        self.size = size
+        self.fps = fps
+        self.buffers = None  # (buffers, frame bytes) array, allocated on the first frame
+        self.free = queue.Queue()
+        self.pending = queue.Queue()
+        self.frames = 0  # frames queued so far, used as frame numbers
+        self.captured = 0
+        self.dropped = 0
+        self.stream = None
+        if fmt == "png":
+            os.makedirs(path, exist_ok=True)
+        else:
+            self.stream = open(path, "wb")
+            if fmt == "y4m":
+                self.stream.write(f"YUV4MPEG2 W{size[0]} H{size[1]} F{fps}:1 Ip A1:1 C444\n".encode())
+        self.buffer_count = buffers
+        self.thread = threading.Thread(target=self._run, name="capture-encoder", daemon=True)
+        self.thread.start()
+
+    def _allocate(self, surface):
+        """Preallocate the buffer pool to match the surface's raw pixel layout"""
+        nbytes = surface.get_pitch() * surface.get_height()
+        self.buffers = ASSET_MEMORY.register("capture buffers", np.empty((self.buffer_count, nbytes), dtype=np.uint8))
+        for i in range(self.buffer_count):
+            self.free.put(i)
+        self.layout = (surface.get_pitch(), surface.get_shifts()[:3])
+
+    def capture(self, surface, wait=False):
+        """Copy a frame into a free buffer and queue it; if the encoder is behind, wait or drop it"""
+        if surface.get_bytesize() != 4 or surface.get_size() != self.size:
+            self.dropped += 1
+            return
+        if self.buffers is None:
+            self._allocate(surface)
+        try:
+            index = self.free.get(block=wait)
+        except queue.Empty:
+            self.dropped += 1
+            return
+        # Raw memcpy of the pixels; color conversion happens on the encoder thread
+        self.buffers[index][:] = surface.get_buffer()
+        self.pending.put((index, self.frames))
+        self.frames += 1
+
+    def close(self):
+        """Finish encoding queued frames and close the output"""
+        self.pending.put(None)
+        self.thread.join()
+        if self.stream is not None:
+            self.stream.close()
+        self.buffers = None
+        ASSET_MEMORY.release("capture buffers")
+        print(f"Capture: {self.captured} frames written to {self.path}, {self.dropped} dropped")
+
+    def _to_rgb(self, raw):
+        """Convert a raw 32-bit frame to an (height, width, 3) RGB array"""
+        pitch, shifts = self.layout
+        width, height = self.size
+        pixels = raw.view(np.uint32).reshape(height, pitch // 4)[:, :width]
+        rgb = np.empty((height, width, 3), dtype=np.uint8)
+        for channel, shift in enumerate(shifts):
+            rgb[:, :, channel] = (pixels >> shift) & 0xFF
+        return rgb
+
+    def _encode(self, rgb, frame_no):
+        """Write one RGB frame in the configured format"""
+        if self.fmt == "png":
+            Image.fromarray(rgb, 'RGB').save(os.path.join(self.path, f"frame_{frame_no:06d}.png"))
+        elif self.fmt == "raw":
+            self.stream.write(rgb.tobytes())
+        else:
+            # BT.601 limited range, full-resolution chroma
+            r, g, b = (rgb[:, :, i].astype(np.float32) for i in range(3))
+            y = 16 + 0.257 * r + 0.504 * g + 0.098 * b
+            u = 128 - 0.148 * r - 0.291 * g + 0.439 * b
+            v = 128 + 0.439 * r - 0.368 * g - 0.071 * b
+            self.stream.write(b"FRAME\n")
+            for plane in (y, u, v):
+                self.stream.write(np.clip(plane + 0.5, 0, 255).astype(np.uint8).tobytes())
+
+    def _run(self):
+        """Encoder thread"""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            index, frame_no = item
+            try:
+                rgb = self._to_rgb(self.buffers[index])
+            finally:
+                self.free.put(index)
+            try:
+                self._encode(rgb, frame_no)
+                self.captured += 1
+            except Exception as e:
+                print(f"Failed to encode frame {frame_no}: {e}")
+
+
+# Input recording for deterministic replay
+class InputCommand(namedtuple("InputCommand", "kind pos code seen", defaults=(None,))):
+    """One input for the simulation: kind "click" (pos, code = mouse button) or "key" (code = key).
+
+    seen is the frame on screen when a click was made; hits are tested against it.
+    """
+    __slots__ = ()
+
+
+class InputRecorder:
+    """Records input commands per simulation tick, together with the starting game state"""
+    def __init__(self, path, initial_state):
+        self.path = path
+        self.initial_state = initial_state
+        self.ticks = 0
+        self.events = []
+
+    def record(self, command):
+        """Remember an input command at the current tick"""
+        if command.kind == "click":
+            self.events.append([self.ticks, "click", command.pos[0], command.pos[1], command.code, command.seen])
+        else:
+            self.events.append([self.ticks, "key", command.code])
+
+    def save(self):
+        """Write the recording as JSON"""
+        data = {
+            'version': 1,
+            'fps': FPS,
+            'ticks': self.ticks,
+            'state': base64.b64encode(self.initial_state).decode("ascii"),
+            'events': self.events,
+        }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        print(f"Recorded {len(self.events)} inputs over {self.ticks} ticks to {self.path}")
+
+
+class InputReplay:
+    """Plays back an InputRecorder file tick by tick"""
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.initial_state = base64.b64decode(data['state'])
+        self.end_tick = data['ticks']
+        self.events = deque(data['events'])
+        self.ticks = 0
+
+    def finished(self):
+        """True once every recorded tick has been replayed"""
+        return self.ticks >= self.end_tick
+
+    def commands_now(self):
+        """Return the input commands recorded at the current tick"""
+        commands = []
+        while self.events and self.events[0][0] <= self.ticks:
+            item = self.events.popleft()
+            if item[1] == "click":
+                seen = item[5] if len(item) > 5 else None
+                commands.append(InputCommand("click", (item[2], item[3]), item[4], seen))
+            else:
+                commands.append(InputCommand("key", None, item[2]))
+        return commands
+
+
+# Asset hot reload (development mode)
+class AssetWatcher:
+    """Polls asset file mtimes and rebuilds only the artefacts that depend on changed files.
+
+    Rebuilding runs on the watcher's worker thread; finished artefacts wait in `ready`
+    until the game swaps them in on the main thread.
+    """
+    def __init__(self, dependencies, builders, interval=0.5):
+        self.dependencies = dependencies  # file path -> [artefact names]
+        self.builders = builders  # artefact name -> callable returning the rebuilt value
+        self.interval = interval
+        self.ready = queue.Queue()  # (artefact name, value)
+        self.mtimes = {path: self._mtime(path) for path in dependencies}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="asset-watcher", daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def stop(self):
+        """Stop watching"""
+        self.stop_event.set()
+        self.thread.join(1.0)
+
+    def take_ready(self):
+        """Return rebuilt artefacts waiting to be swapped in"""
+        items = []
+        while True:
+            try:
+                items.append(self.ready.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _run(self):
+        """Worker thread: poll files, rebuild stale artefacts"""
+        while not self.stop_event.wait(self.interval):
+            stale = []
+            for path, artefacts in self.dependencies.items():
+                mtime = self._mtime(path)
+                if mtime == self.mtimes[path]:
+                    continue
+                self.mtimes[path] = mtime
+                if mtime is None:
+                    continue  # deleted (or mid-save), wait for it to come back
+                stale.extend(a for a in artefacts if a not in stale)
+            for artefact in stale:
+                try:
+                    value = self.builders[artefact]()
+                except Exception as e:
+                    print(f"Hot reload: failed to rebuild {artefact}: {e}")
+                    continue
+                print(f"Hot reload: rebuilt {artefact}")
+                self.ready.put((artefact, value))
+
+
+# Post-processing effects
+class PostProcessor:
+    """Retro effects applied in place to the finished frame through a surfarray view.
+
+    Static masks are built once per resolution; each effect is a single NumPy operation.
+    """
+    EFFECTS = ("shimmer", "scanlines", "vignette", "flash")
+    SHIMMER_PHASES = 16  # precomputed shimmer offset tables
+    VIGNETTE_ROWS = 64  # rows darkened per step, so the scratch buffers stay in cache
+
+    def __init__(self, effects, budgets_ms):
+        self.effects = [e for e in self.EFFECTS if e in effects]
+        self.budgets_ms = budgets_ms
+        self.timings_ms = {e: 0.0 for e in self.effects}  # smoothed cost per effect
+        self.masks = {}  # (width, height) -> dict of precomputed masks
+        self.flash = 0.0  # hit flash intensity, 1.0 right after a hit
+        self.last_score = 0
+        self.phase = 0
+
+    def _build_masks(self, width, height):
+        """Precompute masks for one resolution (row-major, matching the pixel view)"""
+        masks = {}
+        # Darken every other row
+        masks['scanlines'] = np.float32(0.78)
+        # Radial falloff towards the corners
+        xs = (np.arange(width, dtype=np.float32) - width / 2) / (width / 2)
+        ys = (np.arange(height, dtype=np.float32) - height / 2) / (height / 2)
+        r2 = ys[:, None] ** 2 + xs[None, :] ** 2
+        # Single-channel 8.8 fixed-point factor (256 = unchanged), applied to two channels of the
+        # packed pixels at a time through uint32 scratch rows
+        vignette = np.round(np.clip(1.0 - 0.35 * r2, 0.0, 1.0) * 256).astype(np.uint16)
+        rows = min(self.VIGNETTE_ROWS, height)
+        masks['vignette'] = ASSET_MEMORY.register(f"vignette mask {width}x{height}", vignette)
+        masks['vignette scratch'] = ASSET_MEMORY.register(f"vignette scratch {width}x{height}",
+                                                          np.empty((2, rows, width), dtype=np.uint32))
+        # Heat shimmer: per phase, the desert floor rows grouped by how far they shift sideways
+        top = int(height * 0.7)
+        tables = []
+        for phase in range(self.SHIMMER_PHASES):
+            angle = 2 * math.pi * phase / self.SHIMMER_PHASES
+            offsets = np.round(2 * np.sin(np.arange(top, height) * 0.35 + angle)).astype(np.intp)
+            tables.append([(shift, np.nonzero(offsets == shift)[0] + top)
+                           for shift in np.unique(offsets) if shift != 0])
+        masks['shimmer'] = tables
+        return masks
+
+    @staticmethod
+    def _shift_rows(pixels, rows, shift):
+        """Rotate the given rows of the packed pixel view left by shift pixels"""
+        src = pixels[rows]
+        pixels[rows, :-shift] = src[:, shift:]
+        pixels[rows, -shift:] = src[:, :shift]
+
+    def _vignette(self, pixels, masks):
+        """Scale every channel by the fixed-point vignette mask, two channels per uint32 multiply"""
+        mask = masks['vignette']
+        scratch = masks['vignette scratch']
+        for start in range(0, pixels.shape[0], scratch.shape[1]):
+            src = pixels[start:start + scratch.shape[1]]
+            factor = mask[start:start + len(src)]
+            low, high = scratch[0, :len(src)], scratch[1, :len(src)]
+            np.bitwise_and(src, 0x00FF00FF, out=low)
+            np.multiply(low, factor, out=low)
+            np.right_shift(low, 8, out=low)
+            np.bitwise_and(low, 0x00FF00FF, out=low)
+            np.right_shift(src, 8, out=high)
+            np.bitwise_and(high, 0x00FF00FF, out=high)
+            np.multiply(high, factor, out=high)
+            np.bitwise_and(high, 0xFF00FF00, out=high)
+            np.bitwise_or(low, high, out=src)
+
+    def apply(self, surface, snap):
+        """Apply enabled effects to surface for the given game snapshot"""
+        if not self.effects:
+            return
+        width, height = surface.get_size()
+        if surface.get_bytesize() != 4 or surface.get_pitch() != width * 4:
+            return  # needs a packed 32-bit surface
+        # Time-varying effects only on animated screens: static and idle frames are cached
+        animated = STATE_RENDER_MODE[snap.state] == "animated"
+        if not animated:
+            self.flash = 0.0
+        elif snap.score > self.last_score:
+            self.flash = 1.0
+        self.last_score = snap.score
+        masks = self.masks.get((width, height))
+        if masks is None:
+            masks = self.masks[(width, height)] = self._build_masks(width, height)
+
+        # surfarray views are x-major; transposed they are contiguous rows of packed pixels
+        pixels = pygame.surfarray.pixels2d(surface).T
+        channels = pixels.view(np.uint8).reshape(height, width, 4)
+        try:
+            for effect in self.effects:
+                start = time.perf_counter()
+                if effect == "shimmer":
+                    if animated:
+                        for shift, rows in masks['shimmer'][self.phase // 4 % self.SHIMMER_PHASES]:
+                            self._shift_rows(pixels, rows, shift % width)
+                elif effect == "scanlines":
+                    np.multiply(channels[1::2], masks['scanlines'], out=channels[1::2], casting='unsafe')
+                elif effect == "vignette":
+                    self._vignette(pixels, masks)
+                elif effect == "flash":
+                    if self.flash > 0.05:
+                        np.maximum(channels, np.uint8(120 * self.flash), out=channels)
+                elapsed = (time.perf_counter() - start) * 1000.0
+                self.timings_ms[effect] += (elapsed - self.timings_ms[effect]) * 0.1
+        finally:
+            del pixels, channels  # unlock the surface before it is flipped
+        self.phase += 1
+        self.flash *= 0.7
+
+
+# Profiler overlay
+class ProfilerOverlay:
+    """On-screen frame timing breakdown (toggle with F3)"""
+    def __init__(self):
+        self.visible = False
+        self.font = None
+        self.sections_ms = {}  # smoothed time per section
+
+    def add(self, name, ms):
+        """Record the time spent in a section this frame"""
+        previous = self.sections_ms.get(name, ms)
+        self.sections_ms[name] = previous + (ms - previous) * 0.1
+
+    def draw(self, screen, pacer, post):
+        """Draw the overlay in the top right corner"""
+        if self.font is None:
+            self.font = pygame.font.Font(None, 20)
+        stats = pacer.stats()
+        lines = [(f"{pacer.mode}  {stats.get('fps', 0):.1f} fps  "
+                  f"jitter {stats.get('stdev_ms', 0):.2f} ms  late {stats['late']}", WHITE)]
+        for name, ms in self.sections_ms.items():
+            lines.append((f"{name:<8} {ms:6.2f} ms", WHITE))
+        for effect, ms in post.timings_ms.items():
+            budget = post.budgets_ms.get(effect)
+            over = budget is not None and ms > budget
+            label = f"fx {effect:<9} {ms:5.2f} / {budget:.1f} ms" if budget is not None else f"fx {effect:<9} {ms:5.2f} ms"
+            lines.append((label, (255, 90, 90) if over else (120, 255, 120)))
+
+        width = 260
+        panel = pygame.Surface((width, 8 + 18 * len(lines)), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        for i, (text, color) in enumerate(lines):
+            panel.blit(self.font.render(text, True, color), (6, 4 + 18 * i))
+        screen.blit(panel, (screen.get_width() - width - 8, 8))
+
+
 # Overwatch style font selection (Big Noodle Titling, etc.)
 def get_overwatch_font(size, bold=False, italic=False):
     """Try to load Overwatch style fonts (Big Noodle Titling), fallback to similar system fonts or default."""
@@ -227,41 +1101,54 @@ except Exception as e:
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 FPS = 60
+PACING_MODE = "hybrid"  # "hybrid" (sleep + spin), "vsync" or "uncapped"
+PACING_STATS = False  # Print frame time statistics on exit
+SIMULATION_THREAD = True  # Run game updates on a separate thread from rendering
+PLATE_POSITION_FRAMES = 8  # Frames of plate positions kept to hit-test clicks against the frame shown
+REWIND_SECONDS = 0  # Keep this many seconds of per-frame state for Game.rewind (0 = off)
+CRASH_STATE_DIR = "crash_states"  # Game state is written here if the game crashes
+CAPTURE_BUFFERS = 8  # Preallocated frame buffers for gameplay capture
+HOT_RELOAD = False  # Development mode: rebuild and swap in assets when their files change
+HOT_RELOAD_INTERVAL = 0.5  # Seconds between asset file polls
+POST_EFFECTS = ()  # Any of "shimmer", "scanlines", "vignette", "flash"
+POST_EFFECT_BUDGET_MS = {"shimmer": 1.0, "scanlines": 1.0, "vignette": 2.0, "flash": 1.5}
+IDLE_WAIT_MS = 500  # Max time to block waiting for input on idle screens
+EVENT_FILTERING = True  # Only let SDL queue the event types the current state handles
+CPU_STATS = False  # Print CPU use per game state on exit
+GC_CONTROL = False  # Freeze assets, no automatic GC during gameplay (collect in frame slack instead)
+GC_SLACK_MS = 4.0  # Min time left in a frame to run a deferred collection
+GC_STATS = False  # Print GC pauses per game state on exit
+ALLOC_AUDIT = False  # Report the call sites that allocate most per frame on exit (tracemalloc)
+SPRITE_ATLAS = "sprite_atlas.json"  # Index written by sprite_bake.py, used if present
+PALETTE_QUANTIZE = False  # Convert background and sprites to 8-bit palette surfaces
+PALETTE_SHARED = True  # One palette for all assets (False: one palette per asset)
+PALETTE_MAX_ERROR = 24  # Max per-channel color error, otherwise keep the RGBA surface
+PALETTE_BENCHMARK = False  # Print memory/blit comparison against RGBA surfaces
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 BLUE = (135, 206, 235)  # Sky blue
 SAND = (238, 214, 175)  # Desert color
 BROWN = (139, 90, 43)
 
+# Telemetry settings
+TELEMETRY_ENABLED = True
+TELEMETRY_DIR = "telemetry"
+TELEMETRY_QUEUE_SIZE = 4096
+TELEMETRY_POLICY = "drop_newest"  # "drop_newest", "drop_oldest" or "block"
+
+# Memory accounting settings
+MEMORY_REPORT = False  # Print asset memory report on exit
+MEMORY_TRACEMALLOC = False  # Take tracemalloc snapshots at state transitions
+ASSET_MEMORY_BUDGET = None  # Bytes, e.g. 16 * 1024 * 1024; None for unlimited
+ASSET_BUDGET_POLICY = "log"  # "log" or "fail"
+
+ASSET_MEMORY = AssetMemoryTracker(ASSET_MEMORY_BUDGET, ASSET_BUDGET_POLICY, MEMORY_TRACEMALLOC)
+
 # Extract colors from background image
 def extract_background_colors(image_path="background2.jpg"):
-    """Extract main colors and regions from background image"""
+    """Extract main colors and regions from background image, or default colors if it cannot be read"""
     try:
-        img = Image.open(image_path)
-        img = img.resize((SCREEN_WIDTH, SCREEN_HEIGHT))
-        img_array = np.array(img)
-        
-        # Divide image into different regions to extract main colors
-        height, width = img_array.shape[:2]
-        
-        # Top sky region (0-40%)
-        sky_region = img_array[0:int(height*0.4), :]
-        sky_color = tuple(np.mean(sky_region, axis=(0, 1)).astype(int).tolist())
-        
-        # Middle region (40-70%)
-        middle_region = img_array[int(height*0.4):int(height*0.7), :]
-        middle_color = tuple(np.mean(middle_region, axis=(0, 1)).astype(int).tolist())
-        
-        # Bottom ground region (70-100%)
-        ground_region = img_array[int(height*0.7):, :]
-        ground_color = tuple(np.mean(ground_region, axis=(0, 1)).astype(int).tolist())
-        
-        return {
-            'sky': sky_color,
-            'middle': middle_color,
-            'ground': ground_color,
-            'full_array': img_array
-        }
+        return read_background_colors(image_path)
     except Exception as e:
         print(f"Failed to load background image: {e}")
         # Return default colors
@@ -272,133 +1159,73 @@ def extract_background_colors(image_path="background2.jpg"):
             'full_array': None
         }
 
+
+def read_background_colors(image_path="background2.jpg"):
+    """Extract main colors and regions from background image; raises if it cannot be read"""
+    img = Image.open(image_path)
+    img = img.resize((SCREEN_WIDTH, SCREEN_HEIGHT))
+    img_array = np.array(img)
+    
+    # Divide image into different regions to extract main colors
+    height, width = img_array.shape[:2]
+    
+    # Top sky region (0-40%)
+    sky_region = img_array[0:int(height*0.4), :]
+    sky_color = tuple(np.mean(sky_region, axis=(0, 1)).astype(int).tolist())
+    
+    # Middle region (40-70%)
+    middle_region = img_array[int(height*0.4):int(height*0.7), :]
+    middle_color = tuple(np.mean(middle_region, axis=(0, 1)).astype(int).tolist())
+    
+    # Bottom ground region (70-100%)
+    ground_region = img_array[int(height*0.7):, :]
+    ground_color = tuple(np.mean(ground_region, axis=(0, 1)).astype(int).tolist())
+    
+    return {
+        'sky': sky_color,
+        'middle': middle_color,
+        'ground': ground_color,
+        'full_array': img_array
+    }
+
 # Extract background colors
 BG_COLORS = extract_background_colors()
-SKY_COLOR = BG_COLORS['sky']
-MIDDLE_COLOR = BG_COLORS['middle']
-GROUND_COLOR = BG_COLORS['ground']
+ASSET_MEMORY.register("background2.jpg (array)", BG_COLORS['full_array'])
 
 # Game states
 STATE_INTRO = 0
 STATE_WALK = 1
 STATE_GAMEPLAY = 2
 STATE_GAMEOVER = 3
+# How each state renders: "animated" changes every frame, "static" shows a fixed
+# picture while its timer runs, "idle" shows a fixed picture until input arrives
+STATE_RENDER_MODE = {
+    STATE_INTRO: "static",
+    STATE_WALK: "animated",
+    STATE_GAMEPLAY: "animated",
+    STATE_GAMEOVER: "idle",
+}
+# Event types delivered in each state: quit, F3 overlay and redraw requests everywhere, clicks in gameplay
+BASE_EVENT_TYPES = (pygame.QUIT, pygame.KEYDOWN, pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED)
+STATE_EVENT_TYPES = {
+    STATE_INTRO: BASE_EVENT_TYPES,
+    STATE_WALK: BASE_EVENT_TYPES,
+    STATE_GAMEPLAY: BASE_EVENT_TYPES + (pygame.MOUSEBUTTONDOWN,),
+    STATE_GAMEOVER: BASE_EVENT_TYPES,
+}
+
+STATE_NAMES = {
+    STATE_INTRO: "intro",
+    STATE_WALK: "walk",
+    STATE_GAMEPLAY: "gameplay",
+    STATE_GAMEOVER: "gameover",
+}
 
 
 def pixelate_image(image_path, target_size=(100, 100), pixel_size=4):
-    """Convert image to pixel art style"""
+    """Convert image to pixel art style, or a placeholder if it cannot be read"""
     try:
-        img = Image.open(image_path)
-        # Maintain original image aspect ratio
-        img.thumbnail(target_size, Image.Resampling.LANCZOS)
-        
-        # Convert to RGBA to maintain transparency
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-        
-        img_array = np.array(img)
-        height, width = img_array.shape[:2]
-        
-        # Create pixelated image array
-        pixelated = np.zeros_like(img_array)
-        
-        for y in range(0, height, pixel_size):
-            for x in range(0, width, pixel_size):
-                y_end = min(y + pixel_size, height)
-                x_end = min(x + pixel_size, width)
-                
-                # Get region
-                region = img_array[y:y_end, x:x_end]
-                
-                # If region is mostly transparent, keep transparent
-                alpha_values = region[:, :, 3]
-                avg_alpha = np.mean(alpha_values)
-                
-                if avg_alpha < 50:  # Mostly transparent
-                    pixel_color = [0, 0, 0, 0]
-                else:
-                    # Use center point color
-                    y_center = min(y + pixel_size // 2, height - 1)
-                    x_center = min(x + pixel_size // 2, width - 1)
-                    center_color = img_array[y_center, x_center].copy()
-                    
-                    # Enhance color saturation, reduce gray
-                    rgb = center_color[:3].astype(float)
-                    
-                    # If not close to black or white, enhance saturation
-                    brightness = np.mean(rgb)
-                    if 30 < brightness < 225:
-                        # Find max and min color channels
-                        max_val = np.max(rgb)
-                        min_val = np.min(rgb)
-                        
-                        # If color is too gray, slightly enhance contrast
-                        if max_val - min_val < 50:  # Color too gray
-                            # Overall enhance contrast while maintaining hue
-                            rgb = np.clip((rgb - 128) * 1.15 + 128, 0, 255)
-                        else:
-                            # Non-gray regions slightly enhance contrast
-                            rgb = np.clip((rgb - 128) * 1.05 + 128, 0, 255)
-                    
-                    center_color[:3] = rgb.astype(np.uint8)
-                    pixel_color = center_color.tolist()
-                
-                # Fill pixel block
-                pixelated[y:y_end, x:x_end] = pixel_color
-        
-        # Convert back to PIL image
-        pixelated_img = Image.fromarray(pixelated.astype('uint8'), 'RGBA')
-        
-        # Create pygame surface
-        mode = pixelated_img.mode
-        size = pixelated_img.size
-        data = pixelated_img.tobytes()
-        
-        py_image = pygame.image.fromstring(data, size, mode)
-        
-        # Adjust to target size
-        final_surface = pygame.Surface(target_size, pygame.SRCALPHA)
-        # Center draw
-        x_offset = (target_size[0] - size[0]) // 2
-        y_offset = (target_size[1] - size[1]) // 2
-        final_surface.blit(py_image, (x_offset, y_offset))
-        
-        # Add outline
-        # Create outline surface
-        outline_surface = pygame.Surface(target_size, pygame.SRCALPHA)
-        outline_color = (0, 0, 0, 255)  # Black outline
-        
-        # Detect edges and draw outline
-        for y in range(target_size[1]):
-            for x in range(target_size[0]):
-                try:
-                    current_alpha = final_surface.get_at((x, y))[3]
-                    
-                    if current_alpha > 128:  # Current pixel opaque
-                        # Check if neighboring pixels are transparent
-                        is_edge = False
-                        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                            nx, ny = x + dx, y + dy
-                            if 0 <= nx < target_size[0] and 0 <= ny < target_size[1]:
-                                neighbor_alpha = final_surface.get_at((nx, ny))[3]
-                                if neighbor_alpha < 128:  # Neighbor transparent
-                                    is_edge = True
-                                    break
-                            else:
-                                is_edge = True
-                                break
-                        
-                        if is_edge:
-                            outline_surface.set_at((x, y), outline_color)
-                except:
-                    pass
-        
-        # Merge outline
-        final_with_outline = pygame.Surface(target_size, pygame.SRCALPHA)
-        final_with_outline.blit(final_surface, (0, 0))
-        final_with_outline.blit(outline_surface, (0, 0))
-        
-        return final_with_outline
+        return load_pixelated(image_path, target_size, pixel_size)
         
     except Exception as e:
         print(f"Failed to load image {image_path}: {e}")
@@ -408,13 +1235,152 @@ def pixelate_image(image_path, target_size=(100, 100), pixel_size=4):
         return surface
 
 
+def load_pixelated(image_path, target_size=(100, 100), pixel_size=4):
+    """Convert image to pixel art style (same pipeline as sprite_bake.py); raises if it cannot be read"""
+    with Image.open(image_path) as img:
+        pixelated = pixelate_rgba(img, target_size, pixel_size)
+    return pygame.image.fromstring(pixelated.tobytes(), target_size, 'RGBA')
+
+
+class SpriteAtlas:
+    """Packed sprite atlas baked by sprite_bake.py: one surface, frames are sub-rects"""
+    def __init__(self, index_path):
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        image_path = os.path.join(os.path.dirname(index_path), index['image'])
+        self.surface = pygame.image.load(image_path)
+        self.size = tuple(index['size'])
+        self.pixel_size = index['pixel_size']
+        self.rects = {name: pygame.Rect(r['x'], r['y'], r['w'], r['h'])
+                      for name, r in index['frames'].items()}
+        ASSET_MEMORY.register(f"atlas {index['image']}", self.surface)
+
+    def __contains__(self, name):
+        return name in self.rects
+
+    def frame(self, name):
+        """Return a frame as a subsurface (shares the atlas pixels)"""
+        return self.surface.subsurface(self.rects[name])
+
+
+_sprite_atlas = None
+
+
+def get_sprite_atlas():
+    """Load the baked sprite atlas once, or return None if it is not available"""
+    global _sprite_atlas
+    if _sprite_atlas is None and os.path.exists(SPRITE_ATLAS):
+        try:
+            _sprite_atlas = SpriteAtlas(SPRITE_ATLAS)
+            print(f"Loaded sprite atlas: {SPRITE_ATLAS} ({len(_sprite_atlas.rects)} frames)")
+        except Exception as e:
+            print(f"Failed to load sprite atlas {SPRITE_ATLAS}: {e}")
+            _sprite_atlas = False
+    return _sprite_atlas or None
+
+
+def load_sprite(name, image_path, target_size, pixel_size):
+    """Get a sprite frame from the baked atlas, falling back to pixelating at runtime"""
+    atlas = get_sprite_atlas()
+    if atlas is not None and name in atlas and atlas.size == tuple(target_size):
+        return atlas.frame(name)
+    return pixelate_image(image_path, target_size, pixel_size)
+
+
+# Palette quantisation (8-bit indexed surfaces)
+PALETTE_COLORKEY = (255, 0, 255)  # Palette index 0 is reserved for transparency
+PALETTE_CHUNK_COLORS = 4096  # Distinct colors matched against the palette at once (bounds memory)
+
+
+def _opaque_colors(surface):
+    """Return (rgb array (w, h, 3), opaque mask (w, h)) of a surface"""
+    rgb = pygame.surfarray.array3d(surface)
+    opaque = pygame.surfarray.array_alpha(surface) >= 128
+    return rgb, opaque
+
+
+def build_palette(surfaces, max_colors=255):
+    """Build a palette (list of RGB tuples, index 0 excluded) covering the opaque pixels of surfaces"""
+    pixels = []
+    for surface in surfaces:
+        rgb, opaque = _opaque_colors(surface)
+        pixels.append(rgb[opaque])
+    pixels = np.concatenate(pixels) if pixels else np.zeros((0, 3), np.uint8)
+    colors = np.unique(pixels, axis=0)
+    if len(colors) <= max_colors:
+        return [tuple(c) for c in colors.tolist()]
+    # Too many colors: quantize all opaque pixels (max coverage keeps the error lowest here)
+    img = Image.fromarray(pixels.reshape(1, -1, 3).astype(np.uint8), 'RGB')
+    quantized = img.quantize(colors=max_colors, method=Image.Quantize.MAXCOVERAGE)
+    flat = quantized.getpalette()[:max_colors * 3]
+    return [tuple(flat[i:i + 3]) for i in range(0, len(flat), 3)]
+
+
+def quantize_surface(surface, palette=None, max_colors=255):
+    """Convert a surface to an 8-bit palette surface with colorkey transparency.
+
+    Returns (indexed surface, max per-channel color error over opaque pixels).
+    """
+    if palette is None:
+        palette = build_palette([surface], max_colors)
+    rgb, opaque = _opaque_colors(surface)
+    pal = np.array(palette, dtype=np.int32)
+
+    # Map each distinct color to its nearest palette entry (1-based, 0 = transparent)
+    packed = (rgb[..., 0].astype(np.int32) << 16) | (rgb[..., 1].astype(np.int32) << 8) | rgb[..., 2]
+    keys, inverse = np.unique(packed.ravel(), return_inverse=True)
+    colors = np.stack([keys >> 16, (keys >> 8) & 0xFF, keys & 0xFF], axis=1)
+    # |c - p|^2 = |c|^2 - 2 c.p + |p|^2, chunked over colors to bound the distance matrix
+    pal_norm = (pal ** 2).sum(axis=1)
+    nearest = np.empty(len(colors), dtype=np.intp)
+    for start in range(0, len(colors), PALETTE_CHUNK_COLORS):
+        chunk = colors[start:start + PALETTE_CHUNK_COLORS]
+        dist = pal_norm - 2 * (chunk @ pal.T) + (chunk ** 2).sum(axis=1)[:, None]
+        nearest[start:start + PALETTE_CHUNK_COLORS] = dist.argmin(axis=1)
+    indices = (nearest[inverse.ravel()] + 1).reshape(opaque.shape).astype(np.uint8)
+    indices[~opaque] = 0
+
+    error = 0
+    if opaque.any():
+        used = np.unique(inverse.ravel()[opaque.ravel()])
+        error = int(np.abs(pal[nearest[used]] - colors[used]).max())
+
+    # surfarray arrays are (x, y); image strings are row-major
+    indexed = pygame.image.fromstring(np.ascontiguousarray(indices.T).tobytes(), surface.get_size(), 'P')
+    indexed.set_palette([PALETTE_COLORKEY] + list(palette) + [(0, 0, 0)] * (255 - len(palette)))
+    if not opaque.all():
+        indexed.set_colorkey(0)
+    return indexed, error
+
+
+def compare_palette_surfaces(original, indexed, blits=200):
+    """Measure memory and blit throughput of an original surface against its indexed version"""
+    target = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    result = {}
+    for label, surface in (('rgba', original), ('indexed', indexed)):
+        start = time.perf_counter()
+        for _ in range(blits):
+            target.blit(surface, (0, 0))
+        elapsed = time.perf_counter() - start
+        result[label] = {
+            'bytes': surface.get_pitch() * surface.get_height(),
+            'blits_per_sec': blits / elapsed if elapsed > 0 else float('inf'),
+        }
+    return result
+
+
 class Player:
     """Player character class (McBean)"""
     def __init__(self):
         # Load pixelated images, size increased to 125x125 (1.25x original 100)
-        self.image_normal = pixelate_image("huangdou.png", (125, 125), pixel_size=3)
-        self.image_shoot = pixelate_image("huangdou2.png", (125, 125), pixel_size=3)
-        
+        self.image_normal = load_sprite("huangdou", "huangdou.png", (125, 125), pixel_size=3)
+        self.image_shoot = load_sprite("huangdou2", "huangdou2.png", (125, 125), pixel_size=3)
+        ASSET_MEMORY.register("huangdou.png", self.image_normal)
+        ASSET_MEMORY.register("huangdou2.png", self.image_shoot)
+        self.reset()
+    
+    def reset(self):
+        """Reset pose and shooting state (keeps loaded images)"""
         self.current_image = self.image_normal
         self.rect = self.current_image.get_rect()
         self.rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT - 150)
@@ -440,9 +1406,33 @@ class Player:
         screen.blit(self.current_image, self.rect)
 
 
+class PlateView(namedtuple("PlateView", "x y width height color broken pieces")):
+    """Immutable drawing state of a disc (pieces are (x, y, size) tuples)"""
+    __slots__ = ()
+
+    def draw(self, screen):
+        """Draw disc"""
+        if not self.broken:
+            # Draw intact disc (ellipse)
+            pygame.draw.ellipse(screen, self.color, 
+                              (int(self.x - self.width/2), int(self.y - self.height/2), 
+                               self.width, self.height))
+            pygame.draw.ellipse(screen, BLACK, 
+                              (int(self.x - self.width/2), int(self.y - self.height/2), 
+                               self.width, self.height), 2)
+        else:
+            # Draw pieces
+            for x, y, size in self.pieces:
+                pygame.draw.circle(screen, self.color, (int(x), int(y)), size)
+
+
 class Plate:
     """Flying disc/plate class"""
+    next_id = 1  # Unique id for telemetry target tracking
+
     def __init__(self):
+        self.id = Plate.next_id
+        Plate.next_id += 1
         self.width = 60
         self.height = 40
         
@@ -541,21 +1531,14 @@ class Plate:
             }
             self.broken_pieces.append(piece)
     
+    def view(self):
+        """Return an immutable snapshot of this disc for drawing"""
+        pieces = tuple((p['x'], p['y'], p['size']) for p in self.broken_pieces) if self.broken else ()
+        return PlateView(self.x, self.y, self.width, self.height, self.color, self.broken, pieces)
+    
     def draw(self, screen):
         """Draw disc"""
-        if not self.broken:
-            # Draw intact disc (ellipse)
-            pygame.draw.ellipse(screen, self.color, 
-                              (int(self.x - self.width/2), int(self.y - self.height/2), 
-                               self.width, self.height))
-            pygame.draw.ellipse(screen, BLACK, 
-                              (int(self.x - self.width/2), int(self.y - self.height/2), 
-                               self.width, self.height), 2)
-        else:
-            # Draw pieces
-            for piece in self.broken_pieces:
-                pygame.draw.circle(screen, self.color, 
-                                 (int(piece['x']), int(piece['y'])), piece['size'])
+        self.view().draw(screen)
     
     def is_clicked(self, pos):
         """Check if clicked"""
@@ -566,24 +1549,14 @@ class Plate:
         return dist_x < self.width/2 and dist_y < self.height/2
 
 
-class Tumbleweed:
-    """Tumbleweed class"""
-    def __init__(self):
-        self.x = -50
-        self.y = SCREEN_HEIGHT - 100
-        self.size = 40
-        self.rotation = 0
-        self.speed = 3
-        # Pixel art style colors
-        self.brown_dark = (101, 67, 33)
-        self.brown_medium = (139, 90, 43)
-        self.brown_light = (160, 110, 60)
-    
-    def update(self):
-        """Update position"""
-        self.x += self.speed
-        self.rotation += 5
-    
+class TumbleweedView(namedtuple("TumbleweedView", "x y size rotation")):
+    """Immutable drawing state of the tumbleweed"""
+    __slots__ = ()
+    # Pixel art style colors
+    brown_dark = (101, 67, 33)
+    brown_medium = (139, 90, 43)
+    brown_light = (160, 110, 60)
+
     def draw(self, screen):
         """Draw pixel art style hollow tumbleweed"""
         center_x = int(self.x)
@@ -642,15 +1615,214 @@ class Tumbleweed:
             pygame.draw.rect(screen, self.brown_medium, (x - 2, y - 2, 4, 4))
 
 
+class Tumbleweed:
+    """Tumbleweed class"""
+    def __init__(self):
+        self.x = -50
+        self.y = SCREEN_HEIGHT - 100
+        self.size = 40
+        self.rotation = 0
+        self.speed = 3
+    
+    def update(self):
+        """Update position"""
+        self.x += self.speed
+        self.rotation += 5
+    
+    def view(self):
+        """Return an immutable snapshot for drawing"""
+        return TumbleweedView(self.x, self.y, self.size, self.rotation)
+    
+    def draw(self, screen):
+        """Draw pixel art style hollow tumbleweed"""
+        self.view().draw(screen)
+
+
+# Binary game-state format (little endian): header, tumbleweed, round results,
+# plates (each followed by its pieces), then the RNG state
+STATE_MAGIC = b"MMGS"
+STATE_VERSION = 2
+_STATE_HEADER = struct.Struct("<4sHBIiiiiiiiiiB?iiiI?HH")
+_STATE_TUMBLEWEED = struct.Struct("<dddhh")  # x, y, rotation, size, speed (size is a range() bound)
+_STATE_RESULT = struct.Struct("<HH")
+_STATE_PLATE = struct.Struct("<IBdddddddHH3B??H")
+_STATE_PIECE = struct.Struct("<ddddH")
+_STATE_RNG = struct.Struct("<I625I?d")
+
+
+class StateHistory:
+    """Ring buffer of binary game states for rewind"""
+    def __init__(self, capacity):
+        self.states = deque(maxlen=capacity)
+
+    def push(self, data):
+        """Remember one state"""
+        self.states.append(data)
+
+    def rewind(self, frames):
+        """Drop the newest frames and return the state from that far back (or None)"""
+        if not self.states:
+            return None
+        frames = min(frames, len(self.states) - 1)
+        for _ in range(frames):
+            self.states.pop()
+        return self.states[-1]
+
+
+GameSnapshot = namedtuple("GameSnapshot", [
+    "frame", "state", "score", "bullets", "round", "total_rounds", "round_results",
+    "selected_option", "player_walk_x", "player_shooting", "player_center",
+    "plates", "tumbleweed",
+])
+
+
+class SnapshotBuffer:
+    """Double buffer of immutable snapshots: the writer fills the back slot, then swaps"""
+    def __init__(self, initial):
+        self.slots = [initial, initial]
+        self.front = 0
+        self.sequence = 0  # number of snapshots published
+        self.lock = threading.Lock()
+
+    def publish(self, snap):
+        """Write snapshot into the back slot and make it the front"""
+        back = 1 - self.front
+        self.slots[back] = snap
+        with self.lock:
+            self.front = back
+            self.sequence += 1
+
+    def latest(self):
+        """Return the most recently published snapshot"""
+        with self.lock:
+            return self.slots[self.front]
+
+
+class SimulationThread:
+    """Runs game updates on a background thread, one tick per rendered frame.
+
+    The render loop requests each tick, then draws the previous tick's snapshot
+    while this one is computed: both threads run on the render pacer's clock,
+    so every snapshot is shown exactly once.
+    """
+    def __init__(self, game):
+        self.game = game
+        self.ticks = queue.SimpleQueue()  # per-frame command lists from the render thread, None to stop
+        self.buffer = SnapshotBuffer(game.snapshot())
+        self.frame_snapshot = self.buffer.latest()  # snapshot the render thread draws this frame
+        self.requested = 0  # ticks requested by the render thread
+        self.completed = 0  # ticks finished (or abandoned) by the simulation
+        self.done = threading.Condition()
+        self.running = False
+        self.finished = False  # set when the game asked to quit
+        self.thread = threading.Thread(target=self._run, name="simulation", daemon=True)
+
+    def start(self):
+        """Start ticking"""
+        self.running = True
+        self.thread.start()
+
+    def stop(self, timeout=1.0):
+        """Stop ticking and wait for the thread"""
+        self.running = False
+        self.ticks.put(None)
+        if self.thread.is_alive() and threading.current_thread() is not self.thread:
+            self.thread.join(timeout)
+
+    def push(self, commands):
+        """Wait for the previous tick, then request the next one (applying commands first)"""
+        with self.done:
+            self.done.wait_for(lambda: self.completed >= self.requested or not self.running, timeout=1.0)
+        self.frame_snapshot = self.buffer.latest()
+        self.requested += 1
+        self.ticks.put(commands)
+
+    def _run(self):
+        """Simulation loop: wait for a tick request, apply its inputs, update, publish snapshot"""
+        while self.running:
+            commands = self.ticks.get()
+            if commands is None:
+                break
+            try:
+                if commands and not self.game.process_commands(commands):
+                    self.finished = True
+                    self.running = False
+                    break
+                self.game.update()
+                self.buffer.publish(self.game.snapshot())
+            except Exception:
+                # Keep the state that crashed for reproduction, then stop the game
+                self.game.dump_crash_state()
+                self.finished = True
+                self.running = False
+                raise
+            finally:
+                with self.done:
+                    self.completed += 1
+                    self.done.notify_all()
+
+
 class Game:
     """Main game class"""
     def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.pacer = FramePacer(FPS, PACING_MODE)
+        self.screen = self.create_display()
         pygame.display.set_caption("M&M McBean")
-        self.clock = pygame.time.Clock()
-        self.bg_surface = self.create_background()
+        self.bg_surface = ASSET_MEMORY.register("background surface", self.create_background())
         self.state = STATE_INTRO
         self.player = Player()
+        # Use Overwatch style font (local fonts/ or system match), unified English display
+        self.font = get_overwatch_font(36)
+        self.big_font = get_overwatch_font(72)
+        if PALETTE_QUANTIZE:
+            self.quantize_assets()
+        # Music management
+        self.music_manager = MusicManager()
+        self.music_manager.load_music()
+        # Start music immediately when game launches, play once (loops=0)
+        self.music_manager.play(loops=0)
+        # Sound effects management
+        self.sound_effects = SoundEffectManager()
+        # Telemetry writer
+        self.telemetry = TelemetryWriter(TELEMETRY_DIR, TELEMETRY_QUEUE_SIZE,
+                                         policy=TELEMETRY_POLICY) if TELEMETRY_ENABLED else None
+        # Background simulation thread (started in run)
+        self.simulation = None
+        # Post-processing and profiler overlay
+        self.post = PostProcessor(POST_EFFECTS, POST_EFFECT_BUDGET_MS)
+        self.profiler = ProfilerOverlay()
+        # Asset watcher for hot reload (development mode)
+        self.asset_watcher = None
+        # Capture and input record/replay (see main() command line options)
+        self.capture = None
+        self.recorder = None
+        self.replay = None
+        # Per-frame state history for rewind
+        self.history = StateHistory(REWIND_SECONDS * FPS) if REWIND_SECONDS > 0 else None
+        # Idle-aware rendering: composed static frames and the key of what is on screen
+        self.static_frames = {}
+        self.frame_key = None
+        self.had_input = False
+        # Frame on screen when input arrives, and recent plate positions to hit-test clicks against it
+        self.shown_frame = None
+        self.plate_positions = deque(maxlen=PLATE_POSITION_FRAMES)
+        # Event types SDL currently queues (None: all)
+        self.event_filtering = EVENT_FILTERING
+        self.allowed_events = None
+        self.reset_game()
+        # Everything loaded so far lives for the whole game
+        self.gc_control = GcController(GC_CONTROL, GC_SLACK_MS)
+        self.gc_control.on_state(self.state)
+        self.gc_control.freeze()
+        self.alloc_audit = AllocationAudit() if ALLOC_AUDIT else None
+        ASSET_MEMORY.snapshot("assets loaded")
+    
+    def reset_game(self):
+        """Reset all simulation state for a new game (assets are kept)"""
+        self.state = STATE_INTRO
+        self.frame = 0
+        self.plate_positions.clear()
+        self.player.reset()
         self.plates = []
         self.tumbleweed = None
         self.score = 0
@@ -663,25 +1835,68 @@ class Game:
         self.walk_timer = 0
         self.player_walk_x = -100
         self.spawn_timer = 0
-        # Use Overwatch style font (local fonts/ or system match), unified English display
-        self.font = get_overwatch_font(36)
-        self.big_font = get_overwatch_font(72)
         self.selected_option = 0  # Game over screen selected option 0=restart, 1=quit
-        # Music management
-        self.music_manager = MusicManager()
+        self.round_start_time = time.time()
+    
+    def restart(self):
+        """Restart from the intro, restarting the music"""
+        # Fade out music then start it again
+        self.music_manager.fadeout(2000)
         self.music_manager.load_music()
-        # Start music immediately when game launches, play once (loops=0)
         self.music_manager.play(loops=0)
-        # Sound effects management
-        self.sound_effects = SoundEffectManager()
+        self.set_state(STATE_INTRO)
+        self.reset_game()
     
-    def create_background(self):
-        """Create pixelated background based on background image"""
+    def quantize_assets(self):
+        """Replace background and player sprites with 8-bit palette surfaces"""
+        assets = {
+            'background surface': self.bg_surface,
+            'huangdou.png': self.player.image_normal,
+            'huangdou2.png': self.player.image_shoot,
+        }
+        palette = build_palette(assets.values()) if PALETTE_SHARED else None
+        self.bg_surface = self.quantize_asset('background surface', self.bg_surface, palette)
+        self.player.image_normal = self.quantize_asset('huangdou.png', self.player.image_normal, palette)
+        self.player.image_shoot = self.quantize_asset('huangdou2.png', self.player.image_shoot, palette)
+
+    def quantize_asset(self, name, surface, palette=None):
+        """Return the 8-bit version of surface, or surface itself if the color error is too large"""
+        indexed, error = quantize_surface(surface, palette)
+        if error > PALETTE_MAX_ERROR:
+            print(f"Palette: keeping RGBA {name}, color error {error} > {PALETTE_MAX_ERROR}")
+            return surface
+        if PALETTE_BENCHMARK:
+            stats = compare_palette_surfaces(surface, indexed)
+            print(f"Palette: {name} error {error}, "
+                  f"{stats['rgba']['bytes'] / 1024:.1f} KiB -> {stats['indexed']['bytes'] / 1024:.1f} KiB, "
+                  f"{stats['rgba']['blits_per_sec']:.0f} -> {stats['indexed']['blits_per_sec']:.0f} blits/s")
+        return ASSET_MEMORY.register(name, indexed)
+
+    def create_display(self):
+        """Create the display surface for the current pacing mode"""
+        if self.pacer.mode == "vsync":
+            # pygame only honours vsync=1 together with SCALED (or OPENGL). SCALED also
+            # changes window behaviour: the 800x600 frame is scaled up to an integer
+            # multiple on large desktops and letterboxed when resized or fullscreen
+            try:
+                screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SCALED, vsync=1)
+                self.pacer.mode_changed = False
+                return screen
+            except pygame.error as e:
+                print(f"VSync not available: {e}")
+                self.pacer.set_mode("hybrid")
+        self.pacer.mode_changed = False
+        return pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+    def create_background(self, colors=None):
+        """Create pixelated background based on background image colors (default BG_COLORS)"""
+        if colors is None:
+            colors = BG_COLORS
         bg_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         
-        if BG_COLORS['full_array'] is not None:
+        if colors['full_array'] is not None:
             # Use actual image to create pixelated background
-            img_array = BG_COLORS['full_array']
+            img_array = colors['full_array']
             pixel_size = 4  # Smaller pixel block size for clearer edges
             
             for y in range(0, SCREEN_HEIGHT, pixel_size):
@@ -716,107 +1931,221 @@ class Game:
             # Top sky
             for y in range(0, int(SCREEN_HEIGHT * 0.4)):
                 color_ratio = y / (SCREEN_HEIGHT * 0.4)
-                color = tuple(int(SKY_COLOR[i] * (1 - color_ratio * 0.3)) for i in range(3))
+                color = tuple(int(colors['sky'][i] * (1 - color_ratio * 0.3)) for i in range(3))
                 pygame.draw.line(bg_surface, color, (0, y), (SCREEN_WIDTH, y))
             
             # Middle
             for y in range(int(SCREEN_HEIGHT * 0.4), int(SCREEN_HEIGHT * 0.7)):
-                pygame.draw.line(bg_surface, MIDDLE_COLOR, (0, y), (SCREEN_WIDTH, y))
+                pygame.draw.line(bg_surface, colors['middle'], (0, y), (SCREEN_WIDTH, y))
             
             # Bottom ground
             for y in range(int(SCREEN_HEIGHT * 0.7), SCREEN_HEIGHT):
-                pygame.draw.line(bg_surface, GROUND_COLOR, (0, y), (SCREEN_WIDTH, y))
+                pygame.draw.line(bg_surface, colors['ground'], (0, y), (SCREEN_WIDTH, y))
         
         return bg_surface
     
+    def set_state(self, state):
+        """Switch game state"""
+        ASSET_MEMORY.snapshot(f"{STATE_NAMES[self.state]} -> {STATE_NAMES[state]}")
+        self.state = state
+        self.gc_control.on_state(state)
+
     def reset_round(self):
         """Reset round"""
         self.plates = []
         self.bullets = 6
         self.round_hits = 0  # Reset current round hits
         self.spawn_timer = 0
+        self.round_start_time = time.time()
     
+    def apply_event_filter(self, state):
+        """Let SDL queue only the event types state handles (None: all types)"""
+        allowed = STATE_EVENT_TYPES[state] if state is not None else None
+        if allowed == self.allowed_events:
+            return
+        if allowed is None:
+            pygame.event.set_allowed(None)
+        else:
+            # Blocking a type flushes it from the queue, so take out the allowed events first and
+            # queue them again in order. No pump, so no new event can arrive in between and be lost
+            kept = [event for event in pygame.event.get(pump=False) if event.type in allowed]
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed(list(allowed))
+            for event in kept:
+                pygame.event.post(event)
+        self.allowed_events = allowed
+
     def handle_events(self):
-        """Handle events"""
-        for event in pygame.event.get():
+        """Collect this frame's input into one command list (sent with the frame's tick to the simulation thread when it is running)"""
+        self.had_input = False
+        if self.event_filtering:
+            self.apply_event_filter(self.state)
+        commands = []
+        for event in pygame.event.get(self.allowed_events):
             if event.type == pygame.QUIT:
                 return False
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                # Window contents were lost, redraw even if nothing changed
+                self.frame_key = None
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.profiler.visible = not self.profiler.visible
+                self.frame_key = None
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                commands.append(InputCommand("click", event.pos, event.button, self.shown_frame))
+            elif event.type == pygame.KEYDOWN:
+                commands.append(InputCommand("key", None, event.key))
+        
+        if commands and self.replay is not None:
+            # Replays are driven by the recording only; live input would change the run
+            commands = []
+        if commands:
+            self.had_input = True
+        if self.simulation is not None:
+            # One tick per rendered frame, with or without input
+            self.simulation.push(commands)
+            return not self.simulation.finished
+        if commands and not self.process_commands(commands):
+            return False
+        return True
+    
+    def process_commands(self, commands):
+        """Apply one frame's input commands in order, return False to quit"""
+        clicks = []
+        for command in commands:
+            if self.recorder is not None:
+                self.recorder.record(command)
+            if command.kind == "click":
+                clicks.append((command.pos, command.seen))
+                continue
+            # Clicks before this key land first
+            self.process_shots(clicks)
+            clicks = []
+            if not self.process_key(command.code):
+                return False
+        self.process_shots(clicks)
+        return True
+    
+    def shot_hits(self, plate, pos, seen):
+        """Hit-test a click against where the plate was in the frame the player saw"""
+        for frame, positions in self.plate_positions:
+            if frame == seen:
+                if plate.id not in positions:
+                    return False  # not on screen yet when the player clicked
+                x, y = positions[plate.id]
+                return abs(pos[0] - x) < plate.width / 2 and abs(pos[1] - y) < plate.height / 2
+        # Frame not recorded (single-threaded, or too old): test the current position
+        return plate.is_clicked(pos)
+    
+    def process_shots(self, positions):
+        """Fire a batch of shots (click position, frame seen): one pass over the plates, one sound per batch"""
+        while positions and self.state == STATE_GAMEPLAY and self.bullets > 0:
+            batch, positions = positions[:self.bullets], positions[self.bullets:]
+            # Each plate is hit by the earliest shot that is on it (same result as shooting one by one)
+            targets = [None] * len(batch)
+            for plate in self.plates:
+                if plate.broken:
+                    continue
+                for i, (pos, seen) in enumerate(batch):
+                    if targets[i] is None and self.shot_hits(plate, pos, seen):
+                        plate.break_plate()
+                        targets[i] = plate
+                        break
             
-            if event.type == pygame.MOUSEBUTTONDOWN and self.state == STATE_GAMEPLAY:
-                if self.bullets > 0:
-                    # Check if disc is hit
-                    pos = pygame.mouse.get_pos()
-                    hit = False
-                    for plate in self.plates:
-                        if plate.is_clicked(pos) and not plate.broken:
-                            plate.break_plate()
-                            self.score += 1
-                            self.round_hits += 1
-                            hit = True
-                            break
-                    
-                    # Shoot (whether hit or not)
-                    self.bullets -= 1
-                    self.player.shoot()
-                    # Play shoot sound effect
-                    self.sound_effects.play_shoot()
-                    
-                    # If this is the 6th bullet (last bullet), settle round immediately
-                    if self.bullets == 0:
-                        # Play transition sound effect
-                        self.sound_effects.play_transition()
-                        # Record this round's result
-                        self.round_results.append((self.round_hits, 6))
-                        
-                        if self.round < self.total_rounds:
-                            self.round += 1
-                            self.reset_round()
-                        else:
-                            # All rounds complete, enter game over state
-                            self.state = STATE_GAMEOVER
-            
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE and self.state == STATE_GAMEOVER:
-                    # Restart game
-                    if self.selected_option == 0:
-                        # Fade out music then reinitialize
-                        self.music_manager.fadeout(2000)
-                        self.__init__()
-                    else:
-                        # Fade out music when quitting
-                        self.music_manager.fadeout(2000)
-                        import time
-                        time.sleep(2.1)  # Wait for fadeout to complete
-                        return False
+            # Shoot (whether hit or not)
+            for (pos, _), target in zip(batch, targets):
+                self.bullets -= 1
+                if target is not None:
+                    self.score += 1
+                    self.round_hits += 1
+                self.record_shot(pos, target is not None, target)
+            self.player.shoot()
+            # Play shoot sound effect
+            self.sound_effects.play_shoot()
+            
+            # If this was the 6th bullet (last bullet), settle round immediately
+            if self.bullets == 0:
+                # Play transition sound effect
+                self.sound_effects.play_transition()
+                # Record this round's result
+                self.round_results.append((self.round_hits, 6))
+                self.record_round()
                 
-                # Game over screen up/down key selection
-                if self.state == STATE_GAMEOVER:
-                    if event.key == pygame.K_UP or event.key == pygame.K_w:
-                        self.selected_option = 0
-                    elif event.key == pygame.K_DOWN or event.key == pygame.K_s:
-                        self.selected_option = 1
-                    elif event.key == pygame.K_RETURN or event.key == pygame.K_KP_ENTER:
-                        # Enter key to confirm selection
-                        if self.selected_option == 0:
-                            # Fade out music then reinitialize
-                            self.music_manager.fadeout(2000)
-                            self.__init__()
-                        else:
-                            # Fade out music when quitting
-                            self.music_manager.fadeout(2000)
-                            import time
-                            time.sleep(2.1)  # Wait for fadeout to complete
-                            return False
+                if self.round < self.total_rounds:
+                    self.round += 1
+                    self.reset_round()
+                else:
+                    # All rounds complete, enter game over state
+                    self.set_state(STATE_GAMEOVER)
+    
+    def fade_out_music(self):
+        """Fade out music when quitting (replays run offline and quit at once)"""
+        if self.replay is not None:
+            return
+        self.music_manager.fadeout(2000)
+        time.sleep(2.1)  # Wait for fadeout to complete
+    
+    def process_key(self, key):
+        """Apply one key press, return False to quit"""
+        if key == pygame.K_SPACE and self.state == STATE_GAMEOVER:
+            # Restart game
+            if self.selected_option == 0:
+                self.restart()
+            else:
+                self.fade_out_music()
+                return False
+        
+        # Game over screen up/down key selection
+        if self.state == STATE_GAMEOVER:
+            if key == pygame.K_UP or key == pygame.K_w:
+                self.selected_option = 0
+            elif key == pygame.K_DOWN or key == pygame.K_s:
+                self.selected_option = 1
+            elif key == pygame.K_RETURN or key == pygame.K_KP_ENTER:
+                # Enter key to confirm selection
+                if self.selected_option == 0:
+                    self.restart()
+                else:
+                    self.fade_out_music()
+                    return False
         
         return True
     
+    def record_shot(self, pos, hit, target):
+        """Send one shot record to telemetry"""
+        if self.telemetry is None:
+            return
+        plate = None
+        if target is not None:
+            plate = {
+                'trajectory': target.trajectory,
+                'x': round(target.x, 2),
+                'y': round(target.y, 2),
+                'speed_x': round(target.speed_x, 3),
+                'start_y': target.start_y,
+                'end_y': target.end_y,
+                'progress': round(min(1.0, target.distance_traveled / target.total_distance), 4),
+            }
+        self.telemetry.record("shot", round=self.round, x=pos[0], y=pos[1], hit=hit,
+                              target=target.id if target is not None else None,
+                              plate=plate, bullets_left=self.bullets)
+
+    def record_round(self):
+        """Send one round summary record to telemetry"""
+        if self.telemetry is None:
+            return
+        self.telemetry.record("round", round=self.round, hits=self.round_hits, shots=6,
+                              score=self.score, duration=round(time.time() - self.round_start_time, 3))
+
     def update(self):
         """Update game logic"""
+        self.frame += 1
+        if self.recorder is not None:
+            self.recorder.ticks += 1
         if self.state == STATE_INTRO:
             # Intro screen, show McBean character
             self.intro_timer += 1
             if self.intro_timer > 120:  # After 2 seconds, enter walk scene
-                self.state = STATE_WALK
+                self.set_state(STATE_WALK)
                 self.tumbleweed = Tumbleweed()
         
         elif self.state == STATE_WALK:
@@ -829,7 +2158,8 @@ class Game:
                 self.tumbleweed.update()
             
             if self.walk_timer > 180:  # After 3 seconds, enter gameplay
-                self.state = STATE_GAMEPLAY
+                self.set_state(STATE_GAMEPLAY)
+                self.round_start_time = time.time()
                 self.player.rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT - 150)
         
         elif self.state == STATE_GAMEPLAY:
@@ -847,10 +2177,163 @@ class Game:
                 plate.update()
                 if not plate.alive:
                     self.plates.remove(plate)
+            self.plate_positions.append((self.frame, {plate.id: (plate.x, plate.y)
+                                                      for plate in self.plates if not plate.broken}))
+        
+        if self.history is not None:
+            self.history.push(self.save_state())
     
-    def draw(self):
-        """Draw game screen"""
-        if self.state == STATE_INTRO:
+    def save_state(self):
+        """Serialize all simulation state (not assets) including the RNG to bytes.
+
+        Call from the simulation thread, or while it is not running.
+        """
+        tw = self.tumbleweed
+        parts = [_STATE_HEADER.pack(
+            STATE_MAGIC, STATE_VERSION, self.state, self.frame, self.score, self.bullets,
+            self.round, self.total_rounds, self.round_hits, self.intro_timer, self.walk_timer,
+            self.spawn_timer, self.player_walk_x, self.selected_option,
+            self.player.is_shooting, self.player.shoot_timer,
+            self.player.rect.centerx, self.player.rect.centery, Plate.next_id,
+            tw is not None, len(self.round_results), len(self.plates))]
+        if tw is not None:
+            parts.append(_STATE_TUMBLEWEED.pack(tw.x, tw.y, tw.rotation, tw.size, tw.speed))
+        for hits, total in self.round_results:
+            parts.append(_STATE_RESULT.pack(hits, total))
+        for plate in self.plates:
+            parts.append(_STATE_PLATE.pack(
+                plate.id, plate.trajectory, plate.x, plate.y, plate.speed_x, plate.start_y,
+                plate.end_y, plate.distance_traveled, plate.total_distance, plate.width,
+                plate.height, *plate.color, plate.alive, plate.broken, len(plate.broken_pieces)))
+            for piece in plate.broken_pieces:
+                parts.append(_STATE_PIECE.pack(piece['x'], piece['y'], piece['vx'], piece['vy'], piece['size']))
+        version, internal, gauss_next = random.getstate()
+        parts.append(_STATE_RNG.pack(version, *internal, gauss_next is not None,
+                                     gauss_next if gauss_next is not None else 0.0))
+        return b"".join(parts)
+
+    def load_state(self, data):
+        """Restore simulation state (including the RNG) from save_state() bytes.
+
+        Everything is parsed and checked before any game state is changed, so
+        invalid data raises ValueError and leaves the game as it was.
+        """
+        try:
+            header = _STATE_HEADER.unpack_from(data, 0)
+        except struct.error:
+            raise ValueError(f"Truncated game state ({len(data)} bytes)") from None
+        magic, version = header[:2]
+        if magic != STATE_MAGIC or version != STATE_VERSION:
+            raise ValueError(f"Unsupported game state (magic {magic!r}, version {version})")
+        (is_shooting, shoot_timer, player_x, player_y, next_id,
+         has_tumbleweed, n_results, n_plates) = header[14:]
+        offset = _STATE_HEADER.size
+
+        try:
+            tumbleweed = None
+            if has_tumbleweed:
+                tumbleweed = Tumbleweed.__new__(Tumbleweed)
+                (tumbleweed.x, tumbleweed.y, tumbleweed.rotation,
+                 tumbleweed.size, tumbleweed.speed) = _STATE_TUMBLEWEED.unpack_from(data, offset)
+                offset += _STATE_TUMBLEWEED.size
+
+            round_results = []
+            for _ in range(n_results):
+                round_results.append(_STATE_RESULT.unpack_from(data, offset))
+                offset += _STATE_RESULT.size
+
+            plates = []
+            for _ in range(n_plates):
+                # Rebuild without __init__, which would consume random numbers
+                plate = Plate.__new__(Plate)
+                (plate.id, plate.trajectory, plate.x, plate.y, plate.speed_x, plate.start_y,
+                 plate.end_y, plate.distance_traveled, plate.total_distance, plate.width,
+                 plate.height, r, g, b, plate.alive, plate.broken, n_pieces) = _STATE_PLATE.unpack_from(data, offset)
+                offset += _STATE_PLATE.size
+                plate.color = (r, g, b)
+                plate.broken_pieces = []
+                for _ in range(n_pieces):
+                    x, y, vx, vy, size = _STATE_PIECE.unpack_from(data, offset)
+                    offset += _STATE_PIECE.size
+                    plate.broken_pieces.append({'x': x, 'y': y, 'vx': vx, 'vy': vy, 'size': size})
+                plates.append(plate)
+
+            rng = _STATE_RNG.unpack_from(data, offset)
+            offset += _STATE_RNG.size
+        except struct.error:
+            raise ValueError(f"Truncated game state ({len(data)} bytes)") from None
+        if offset != len(data):
+            raise ValueError(f"Game state has {len(data) - offset} unexpected trailing bytes")
+        # Last step that can fail: the RNG rejects invalid internal state
+        random.setstate((rng[0], tuple(rng[1:626]), rng[627] if rng[626] else None))
+
+        (self.state, self.frame, self.score, self.bullets, self.round, self.total_rounds,
+         self.round_hits, self.intro_timer, self.walk_timer, self.spawn_timer,
+         self.player_walk_x, self.selected_option) = header[2:14]
+        Plate.next_id = next_id
+        self.player.is_shooting = is_shooting
+        self.player.shoot_timer = shoot_timer
+        self.player.current_image = self.player.image_shoot if is_shooting else self.player.image_normal
+        self.player.rect.center = (player_x, player_y)
+        self.tumbleweed = tumbleweed
+        self.round_results = round_results
+        self.plates = plates
+        self.plate_positions.clear()
+
+    def save_state_file(self, path):
+        """Write the current game state to disk"""
+        with open(path, "wb") as f:
+            f.write(self.save_state())
+
+    def load_state_file(self, path):
+        """Restore game state from a file written by save_state_file"""
+        with open(path, "rb") as f:
+            self.load_state(f.read())
+
+    def dump_crash_state(self):
+        """Write the current state to CRASH_STATE_DIR for reproducing a crash"""
+        try:
+            os.makedirs(CRASH_STATE_DIR, exist_ok=True)
+            path = os.path.join(CRASH_STATE_DIR, time.strftime("crash-%Y%m%d-%H%M%S.state"))
+            self.save_state_file(path)
+            print(f"Game state saved to {path}")
+        except Exception as e:
+            print(f"Failed to save crash state: {e}")
+
+    def rewind(self, seconds):
+        """Go back in time using the state history (needs REWIND_SECONDS > 0)"""
+        if self.history is None:
+            return False
+        data = self.history.rewind(int(seconds * FPS))
+        if data is None:
+            return False
+        self.load_state(data)
+        return True
+
+    def snapshot(self):
+        """Return an immutable snapshot of everything the renderer needs"""
+        return GameSnapshot(
+            frame=self.frame,
+            state=self.state,
+            score=self.score,
+            bullets=self.bullets,
+            round=self.round,
+            total_rounds=self.total_rounds,
+            round_results=tuple(self.round_results),
+            selected_option=self.selected_option,
+            player_walk_x=self.player_walk_x,
+            player_shooting=self.player.is_shooting,
+            player_center=self.player.rect.center,
+            plates=tuple(plate.view() for plate in self.plates),
+            tumbleweed=self.tumbleweed.view() if self.tumbleweed else None,
+        )
+    
+    def draw(self, snap=None):
+        """Draw game screen from a state snapshot"""
+        if snap is None:
+            snap = self.snapshot()
+        start = time.perf_counter()
+        if snap.state == STATE_INTRO:
             # Intro screen
             self.screen.blit(self.bg_surface, (0, 0))
             # Center display McBean
@@ -862,44 +2345,45 @@ class Game:
             title_rect = title.get_rect(center=(SCREEN_WIDTH // 2, 100))
             self.screen.blit(title, title_rect)
         
-        elif self.state == STATE_WALK:
+        elif snap.state == STATE_WALK:
             # Desert scene
             self.screen.blit(self.bg_surface, (0, 0))
             
             # Draw tumbleweed
-            if self.tumbleweed:
-                self.tumbleweed.draw(self.screen)
+            if snap.tumbleweed:
+                snap.tumbleweed.draw(self.screen)
             
             # Draw walking McBean
             temp_rect = self.player.image_normal.get_rect()
-            temp_rect.center = (self.player_walk_x, SCREEN_HEIGHT - 100)
+            temp_rect.center = (snap.player_walk_x, SCREEN_HEIGHT - 100)
             self.screen.blit(self.player.image_normal, temp_rect)
         
-        elif self.state == STATE_GAMEPLAY:
+        elif snap.state == STATE_GAMEPLAY:
             # Game screen
             self.screen.blit(self.bg_surface, (0, 0))
             
             # Draw discs
-            for plate in self.plates:
+            for plate in snap.plates:
                 plate.draw(self.screen)
             
             # Draw player
-            self.player.draw(self.screen)
+            player_image = self.player.image_shoot if snap.player_shooting else self.player.image_normal
+            self.screen.blit(player_image, player_image.get_rect(center=snap.player_center))
             
             # UI (English with OW font)
             # Bullets
-            bullet_text = self.font.render(f"Bullets: {self.bullets}", True, BLACK)
+            bullet_text = self.font.render(f"Bullets: {snap.bullets}", True, BLACK)
             self.screen.blit(bullet_text, (SCREEN_WIDTH - 150, SCREEN_HEIGHT - 50))
             
             # Score
-            score_text = self.font.render(f"Score: {self.score}", True, BLACK)
+            score_text = self.font.render(f"Score: {snap.score}", True, BLACK)
             self.screen.blit(score_text, (20, 20))
             
             # Round
-            round_text = self.font.render(f"Round: {self.round}/{self.total_rounds}", True, BLACK)
+            round_text = self.font.render(f"Round: {snap.round}/{snap.total_rounds}", True, BLACK)
             self.screen.blit(round_text, (20, 60))
         
-        elif self.state == STATE_GAMEOVER:
+        elif snap.state == STATE_GAMEOVER:
             # Game Over screen - Black background with white text
             self.screen.fill(BLACK)
             
@@ -908,13 +2392,13 @@ class Game:
             self.screen.blit(gameover_text, gameover_rect)
             
             # Final Score
-            score_text = self.big_font.render(f"FINAL SCORE: {self.score}/6", True, WHITE)
+            score_text = self.big_font.render(f"FINAL SCORE: {snap.score}/6", True, WHITE)
             score_rect = score_text.get_rect(center=(SCREEN_WIDTH // 2, 200))
             self.screen.blit(score_text, score_rect)
             
             # Hit ratio
-            if self.round_results:
-                hits, total = self.round_results[0]
+            if snap.round_results:
+                hits, total = snap.round_results[0]
                 ratio_text = self.font.render(f"HIT RATIO: {hits}/{total}", True, WHITE)
                 ratio_rect = ratio_text.get_rect(center=(SCREEN_WIDTH // 2, 280))
                 self.screen.blit(ratio_text, ratio_rect)
@@ -923,14 +2407,14 @@ class Game:
             menu_y = 360
             
             # Option 1: Restart
-            restart_color = (100, 255, 100) if self.selected_option == 0 else WHITE
-            restart_text = self.font.render(("▶ RESTART" if self.selected_option == 0 else "  RESTART"), True, restart_color)
+            restart_color = (100, 255, 100) if snap.selected_option == 0 else WHITE
+            restart_text = self.font.render(("▶ RESTART" if snap.selected_option == 0 else "  RESTART"), True, restart_color)
             restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH // 2, menu_y))
             self.screen.blit(restart_text, restart_rect)
             
             # Option 2: Quit
-            quit_color = (255, 100, 100) if self.selected_option == 1 else WHITE
-            quit_text = self.font.render(("▶ QUIT" if self.selected_option == 1 else "  QUIT"), True, quit_color)
+            quit_color = (255, 100, 100) if snap.selected_option == 1 else WHITE
+            quit_text = self.font.render(("▶ QUIT" if snap.selected_option == 1 else "  QUIT"), True, quit_color)
             quit_rect = quit_text.get_rect(center=(SCREEN_WIDTH // 2, menu_y + 50))
             self.screen.blit(quit_text, quit_rect)
             
@@ -939,24 +2423,342 @@ class Game:
             hint_rect = hint_text.get_rect(center=(SCREEN_WIDTH // 2, menu_y + 120))
             self.screen.blit(hint_text, hint_rect)
         
+        post_start = time.perf_counter()
+        self.post.apply(self.screen, snap)
+        if self.profiler.visible:
+            self.profiler.add("draw", (post_start - start) * 1000.0)
+            self.profiler.add("post", (time.perf_counter() - post_start) * 1000.0)
+            self.profiler.draw(self.screen, self.pacer, self.post)
         pygame.display.flip()
     
+    def start_hot_reload(self):
+        """Watch asset files and rebuild what depends on them when they change.
+
+        Builders use loaders that raise instead of falling back to placeholders, so
+        a half-saved file keeps the current asset until the next change.
+        """
+        def sprite(path):
+            def build():
+                surface = load_pixelated(path, (125, 125), pixel_size=3)
+                return self.quantize_asset(path, surface) if PALETTE_QUANTIZE else surface
+            return build
+
+        def atlas_sprites():
+            global _sprite_atlas
+            atlas = SpriteAtlas(SPRITE_ATLAS)
+            frames = tuple(atlas.frame(name) if name in atlas and atlas.size == (125, 125)
+                           else load_pixelated(path, (125, 125), pixel_size=3)
+                           for name, path in (("huangdou", "huangdou.png"), ("huangdou2", "huangdou2.png")))
+            _sprite_atlas = atlas
+            return frames
+
+        def background():
+            colors = read_background_colors()
+            surface = self.create_background(colors)
+            if PALETTE_QUANTIZE:
+                surface = self.quantize_asset('background surface', surface)
+            return colors, surface
+
+        def sound(path):
+            return lambda: pygame.mixer.Sound(path) if AUDIO_ENABLED else None
+
+        dependencies = {
+            "huangdou.png": ["sprite:huangdou"],
+            "huangdou2.png": ["sprite:huangdou2"],
+            "background2.jpg": ["background"],
+            "shoot.mp3": ["sound:shoot"],
+            "bullet_change.mp3": ["sound:transition"],
+            self.music_manager.music_file: ["music"],
+            SPRITE_ATLAS: ["atlas sprites"],
+        }
+        builders = {
+            "sprite:huangdou": sprite("huangdou.png"),
+            "sprite:huangdou2": sprite("huangdou2.png"),
+            "atlas sprites": atlas_sprites,
+            "background": background,
+            "sound:shoot": sound("shoot.mp3"),
+            "sound:transition": sound("bullet_change.mp3"),
+            "music": lambda: self.music_manager.music_file,
+        }
+        self.asset_watcher = AssetWatcher(dependencies, builders, HOT_RELOAD_INTERVAL)
+        print(f"Hot reload: watching {len(dependencies)} asset files")
+
+    def apply_reloads(self):
+        """Swap rebuilt assets into the running game (main thread, game state untouched)"""
+        for artefact, value in self.asset_watcher.take_ready():
+            if artefact == "sprite:huangdou":
+                self.player.image_normal = ASSET_MEMORY.register("huangdou.png", value)
+            elif artefact == "sprite:huangdou2":
+                self.player.image_shoot = ASSET_MEMORY.register("huangdou2.png", value)
+            elif artefact == "atlas sprites":
+                self.player.image_normal, self.player.image_shoot = value
+            elif artefact == "background":
+                colors, surface = value
+                BG_COLORS.update(colors)
+                ASSET_MEMORY.register("background2.jpg (array)", colors['full_array'])
+                self.bg_surface = ASSET_MEMORY.register("background surface", surface)
+            elif artefact == "sound:shoot":
+                self.sound_effects.shoot_sound = ASSET_MEMORY.register("shoot sound", value)
+            elif artefact == "sound:transition":
+                self.sound_effects.transition_sound = ASSET_MEMORY.register("bullet_change sound", value)
+            elif artefact == "music":
+                self.music_manager.is_playing = False
+                self.music_manager.load_music()
+                self.music_manager.play(loops=0)
+            # Cached static frames show the old asset
+            self.clear_static_frames()
+            self.frame_key = None
+
+    def start_capture(self, path, fmt="png"):
+        """Capture every drawn frame to path (directory for png, file otherwise)"""
+        self.capture = FrameCapture(path, fmt, (SCREEN_WIDTH, SCREEN_HEIGHT), FPS, CAPTURE_BUFFERS)
+
+    def start_recording(self, path):
+        """Record input from the current state, written to path on exit"""
+        self.recorder = InputRecorder(path, self.save_state())
+        # Replays start without position history, so hit-test like they will
+        self.plate_positions.clear()
+
+    def start_replay(self, path):
+        """Replay a recording; runs the simulation on the main thread for determinism"""
+        self.replay = InputReplay(path)
+        self.load_state(self.replay.initial_state)
+        # Replayed shots are not player data, keep them out of telemetry
+        if self.telemetry is not None:
+            self.telemetry.close()
+            self.telemetry = None
+
+    def apply_replay_events(self):
+        """Feed recorded input for this tick, return False when the replay is over"""
+        if self.replay.finished():
+            return False
+        if not self.process_commands(self.replay.commands_now()):
+            return False
+        self.replay.ticks += 1
+        return True
+
+    def clear_static_frames(self):
+        """Drop the cached static frames"""
+        for i in range(len(self.static_frames)):
+            ASSET_MEMORY.release(f"static frame {i}")
+        self.static_frames.clear()
+
+    def draw_static(self, snap):
+        """Show a static frame, composing it only once; return False if the screen is already up to date"""
+        key = snap._replace(frame=0)
+        if key == self.frame_key:
+            return False
+        frame = self.static_frames.get(key)
+        if frame is None:
+            if any(cached.state != snap.state for cached in self.static_frames):
+                self.clear_static_frames()
+            self.draw(snap)
+            frame = self.screen.copy()
+            ASSET_MEMORY.register(f"static frame {len(self.static_frames)}", frame)
+            self.static_frames[key] = frame
+        else:
+            self.screen.blit(frame, (0, 0))
+            pygame.display.flip()
+        self.frame_key = key
+        return True
+
     def run(self):
         """Game main loop"""
+        self.cpu_monitor = CpuMonitor()
+        if SIMULATION_THREAD and self.replay is None:
+            self.simulation = SimulationThread(self)
+            self.simulation.start()
+        if HOT_RELOAD and self.asset_watcher is None:
+            self.start_hot_reload()
+        try:
+            self.main_loop()
+        finally:
+            # Also on crashes: stop threads and flush telemetry, capture and recording
+            self.shutdown()
+        if PACING_STATS:
+            stats = self.pacer.stats()
+            print("Frame pacing: " + ", ".join(
+                f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()))
+        if CPU_STATS:
+            print("\n".join(self.cpu_monitor.report()))
+        if MEMORY_REPORT:
+            print("\n".join(ASSET_MEMORY.report()))
+        if GC_STATS:
+            print("\n".join(self.gc_control.report()))
+        if self.alloc_audit is not None:
+            print("\n".join(self.alloc_audit.report()))
+        pygame.quit()
+        sys.exit()
+
+    def main_loop(self):
+        """Run frames until the game quits or the replay ends"""
         running = True
         while running:
+            frame_start = time.perf_counter()
+            if self.alloc_audit is not None:
+                self.alloc_audit.begin_frame()
             running = self.handle_events()
-            self.update()
-            self.draw()
-            self.clock.tick(FPS)
-        
-        pygame.quit()
-        sys.exit()
+            if self.asset_watcher is not None:
+                self.apply_reloads()
+            if self.replay is not None and running and not self.apply_replay_events():
+                break
+            update_start = time.perf_counter()
+            if self.simulation is None:
+                try:
+                    self.update()
+                except Exception:
+                    self.dump_crash_state()
+                    raise
+                snap = self.snapshot()
+                if self.profiler.visible:
+                    self.profiler.add("update", (time.perf_counter() - update_start) * 1000.0)
+            else:
+                snap = self.simulation.frame_snapshot
+            render_mode = STATE_RENDER_MODE[snap.state]
+            if self.profiler.visible:
+                self.profiler.add("events", (update_start - frame_start) * 1000.0)
+                render_mode = "animated"  # overlay numbers change every frame
+            if render_mode == "animated":
+                self.draw(snap)
+                self.frame_key = None
+                changed = True
+            else:
+                changed = self.draw_static(snap)
+            self.shown_frame = snap.frame
+            
+            if self.capture is not None:
+                # Nobody is playing a replay live, so never drop its frames
+                self.capture.capture(self.screen, wait=self.replay is not None)
+            if self.alloc_audit is not None:
+                self.alloc_audit.end_frame()
+            self.gc_control.collect_in_slack(self.pacer.deadline - time.perf_counter())
+            
+            if (render_mode == "idle" and not changed and not self.had_input
+                    and self.replay is None and self.capture is None):
+                # Nothing to do until input arrives: block instead of spinning at FPS
+                # (not while capturing, so unchanged frames repeat at a fixed frame rate)
+                event = pygame.event.wait(IDLE_WAIT_MS)
+                if event.type != pygame.NOEVENT:
+                    pygame.event.post(event)
+                self.pacer.resync()
+            else:
+                self.pacer.tick()
+            self.cpu_monitor.sample(STATE_NAMES[snap.state])
+            if self.pacer.mode_changed:
+                self.screen = self.create_display()
+                self.frame_key = None
+
+    def shutdown(self):
+        """Stop background threads and flush outputs"""
+        if self.simulation is not None:
+            self.simulation.stop()
+        if self.asset_watcher is not None:
+            self.asset_watcher.stop()
+        if self.recorder is not None:
+            self.recorder.save()
+        if self.capture is not None:
+            self.capture.close()
+        # Flush remaining telemetry before exit
+        if self.telemetry is not None:
+            self.telemetry.close()
+
+
+def check_state_roundtrip(game, max_ticks=5000):
+    """Play through every state, checking save -> load -> draw in each; return the states checked"""
+    checked = []
+    for _ in range(max_ticks):
+        state = game.state
+        if state == STATE_GAMEPLAY:
+            unbroken = [p for p in game.plates if not p.broken]
+            if state not in checked and unbroken and not any(p.broken for p in game.plates):
+                # Hit a plate first so its pieces are saved too
+                plate = unbroken[0]
+                game.process_commands([InputCommand("click", (int(plate.x), int(plate.y)), 1)])
+            elif state in checked:
+                game.process_commands([InputCommand("click", (0, 0), 1)])
+        ready = {STATE_WALK: game.tumbleweed is not None,
+                 STATE_GAMEPLAY: any(p.broken for p in game.plates)}.get(state, True)
+        if state not in checked and ready:
+            data = game.save_state()
+            game.load_state(data)
+            if game.save_state() != data:
+                raise ValueError(f"State {STATE_NAMES[state]} changed after save -> load")
+            game.draw(game.snapshot())
+            checked.append(state)
+            if len(checked) == len(STATE_NAMES):
+                break
+        game.update()
+    return [STATE_NAMES[state] for state in checked]
+
+
+def benchmark_event_handling(game, frames=120, motions=500):
+    """Time handle_events per frame, with and without filtering, while the mouse moves fast"""
+    game.set_state(STATE_GAMEPLAY)
+    result = {}
+    for label, filtering in (('unfiltered', False), ('filtered', True)):
+        game.event_filtering = filtering
+        game.apply_event_filter(STATE_GAMEPLAY if filtering else None)
+        elapsed = 0.0
+        for i in range(frames):
+            # Blocked types are dropped when posted, as SDL does for real input
+            for j in range(motions):
+                pygame.event.post(pygame.event.Event(pygame.MOUSEMOTION, pos=(j % SCREEN_WIDTH, i % SCREEN_HEIGHT),
+                                                     rel=(1, 0), buttons=(0, 0, 0)))
+            start = time.perf_counter()
+            game.handle_events()
+            elapsed += time.perf_counter() - start
+        result[label] = elapsed / frames * 1000.0
+    game.event_filtering = EVENT_FILTERING
+    return result
 
 
 def main():
     """Main function"""
+    global PACING_MODE
+    parser = argparse.ArgumentParser(description="M&M McBean")
+    parser.add_argument("--record", metavar="FILE", help="record input for deterministic replay")
+    parser.add_argument("--replay", metavar="FILE", help="replay a recorded session")
+    parser.add_argument("--capture", metavar="PATH", help="capture frames (directory for png, file for y4m/raw)")
+    parser.add_argument("--capture-format", choices=FrameCapture.FORMATS, default="png")
+    parser.add_argument("--headless", action="store_true", help="run without a window (SDL dummy video driver)")
+    parser.add_argument("--pacing", choices=FramePacer.MODES, help=f"frame pacing mode (default {PACING_MODE})")
+    parser.add_argument("--dev", action="store_true", help="development mode: hot-reload assets when files change")
+    parser.add_argument("--check-state", action="store_true", help="save, reload and draw every game state, then exit")
+    parser.add_argument("--event-benchmark", action="store_true", help="time event handling under a mouse motion flood and exit")
+    args = parser.parse_args()
+
+    if args.headless:
+        # pygame.init() already ran; restart the display with the dummy driver
+        pygame.display.quit()
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        pygame.display.init()
+    if args.pacing:
+        PACING_MODE = args.pacing
+
     game = Game()
+    if args.check_state:
+        # Test shots are not player data
+        if game.telemetry is not None:
+            game.telemetry.close()
+            game.telemetry = None
+        print("State round trip OK: " + ", ".join(check_state_roundtrip(game)))
+        pygame.quit()
+        return
+    if args.event_benchmark:
+        for label, ms in benchmark_event_handling(game).items():
+            print(f"Event handling ({label}): {ms:.3f} ms/frame")
+        if game.telemetry is not None:
+            game.telemetry.close()
+        pygame.quit()
+        return
+    if args.replay:
+        game.start_replay(args.replay)
+    if args.record:
+        game.start_recording(args.record)
+    if args.capture:
+        game.start_capture(args.capture, args.capture_format)
+    if args.dev:
+        game.start_hot_reload()
     game.run()
 
 
@@ -0,0 +1,183 @@
+"""Offline sprite bake: pixelate and outline a directory of sprites into one texture atlas.
+
+Usage:
+    python sprite_bake.py SPRITE_DIR [-o sprite_atlas.png] [--size 125x125] [--pixel-size 3]
+
+Writes the atlas image plus a JSON index (same name, .json) mapping each frame name
+(file path relative to SPRITE_DIR, without extension) to its rect in the atlas.
+This module only depends on Pillow and NumPy so worker processes start quickly.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+def pixelate_rgba(img, target_size=(100, 100), pixel_size=4):
+    """Convert a PIL image to a pixel-art RGBA array of target_size (height, width, 4)"""
+    img = img.copy()
+    # Maintain original image aspect ratio
+    img.thumbnail(target_size, Image.Resampling.LANCZOS)
+
+    # Convert to RGBA to maintain transparency
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+
+    img_array = np.array(img)
+    height, width = img_array.shape[:2]
+
+    # Block starts and mean alpha of each (possibly partial) block
+    ys = np.arange(0, height, pixel_size)
+    xs = np.arange(0, width, pixel_size)
+    alpha = img_array[:, :, 3].astype(np.float64)
+    alpha_sum = np.add.reduceat(np.add.reduceat(alpha, ys, axis=0), xs, axis=1)
+    block_h = np.diff(np.append(ys, height))
+    block_w = np.diff(np.append(xs, width))
+    avg_alpha = alpha_sum / np.outer(block_h, block_w)
+
+    # Use center point color of each block
+    y_center = np.minimum(ys + pixel_size // 2, height - 1)
+    x_center = np.minimum(xs + pixel_size // 2, width - 1)
+    colors = img_array[y_center[:, None], x_center[None, :]].copy()
+
+    # Enhance color saturation, reduce gray (only if not close to black or white)
+    rgb = colors[:, :, :3].astype(float)
+    brightness = rgb.mean(axis=2)
+    spread = rgb.max(axis=2) - rgb.min(axis=2)
+    factor = np.where(spread < 50, 1.15, 1.05)  # gray blocks get more contrast
+    enhanced = np.clip((rgb - 128) * factor[:, :, None] + 128, 0, 255)
+    mid = (brightness > 30) & (brightness < 225)
+    rgb = np.where(mid[:, :, None], enhanced, rgb)
+    colors[:, :, :3] = rgb.astype(np.uint8)
+
+    # Mostly transparent blocks stay transparent
+    colors[avg_alpha < 50] = 0
+
+    # Fill pixel blocks
+    pixelated = np.repeat(np.repeat(colors, block_h, axis=0), block_w, axis=1)
+
+    # Center on a target_size canvas
+    canvas = np.zeros((target_size[1], target_size[0], 4), dtype=np.uint8)
+    y_offset = (target_size[1] - height) // 2
+    x_offset = (target_size[0] - width) // 2
+    canvas[y_offset:y_offset + height, x_offset:x_offset + width] = pixelated
+
+    return add_outline(canvas)
+
+
+def add_outline(rgba):
+    """Paint opaque pixels that touch transparency (or the border) black"""
+    a = rgba[:, :, 3]
+    opaque = a > 128
+    # Pad with "transparent" so pixels on the canvas border count as edges
+    transparent = np.pad(a < 128, 1, constant_values=True)
+    edge = opaque & (transparent[:-2, 1:-1] | transparent[2:, 1:-1] |
+                     transparent[1:-1, :-2] | transparent[1:-1, 2:])
+    rgba[edge] = (0, 0, 0, 255)
+    return rgba
+
+
+def bake_sprite(job):
+    """Worker: load and pixelate one sprite, return (name, rgba array)"""
+    name, path, target_size, pixel_size = job
+    with Image.open(path) as img:
+        return name, pixelate_rgba(img, target_size, pixel_size)
+
+
+def pack_atlas(frames, padding=1):
+    """Shelf-pack frames {name: array} into one image, return (atlas array, rects)"""
+    if not frames:
+        raise ValueError("no frames to pack")
+    area = sum((f.shape[0] + padding) * (f.shape[1] + padding) for f in frames.values())
+    widest = max(f.shape[1] for f in frames.values())
+    atlas_width = max(widest, 2 ** math.ceil(math.log2(math.sqrt(area))))
+
+    # Tallest first, fill rows left to right
+    rects = {}
+    x = y = shelf_height = 0
+    for name in sorted(frames, key=lambda n: (-frames[n].shape[0], n)):
+        h, w = frames[name].shape[:2]
+        if x + w > atlas_width:
+            x = 0
+            y += shelf_height + padding
+            shelf_height = 0
+        rects[name] = (x, y, w, h)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+
+    atlas = np.zeros((y + shelf_height, atlas_width, 4), dtype=np.uint8)
+    for name, (x, y, w, h) in rects.items():
+        atlas[y:y + h, x:x + w] = frames[name]
+    return atlas, rects
+
+
+def find_sprites(src_dir, pattern="*.png"):
+    """Return {frame name: path} for all sprites under src_dir"""
+    sprites = {}
+    for path in sorted(glob.glob(os.path.join(src_dir, "**", pattern), recursive=True)):
+        name = os.path.splitext(os.path.relpath(path, src_dir))[0].replace(os.sep, "/")
+        sprites[name] = path
+    return sprites
+
+
+def bake(src_dir, output="sprite_atlas.png", target_size=(125, 125), pixel_size=3,
+         workers=None, pattern="*.png", padding=1):
+    """Bake all sprites in src_dir into an atlas image and JSON index, return the index"""
+    sprites = find_sprites(src_dir, pattern)
+    if not sprites:
+        raise ValueError(f"no sprites matching {pattern} in {src_dir}")
+
+    jobs = [(name, path, target_size, pixel_size) for name, path in sprites.items()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        frames = dict(pool.map(bake_sprite, jobs))
+
+    atlas, rects = pack_atlas(frames, padding)
+    Image.fromarray(atlas, 'RGBA').save(output)
+
+    index = {
+        'image': os.path.basename(output),
+        'size': list(target_size),
+        'pixel_size': pixel_size,
+        'frames': {name: {'x': x, 'y': y, 'w': w, 'h': h} for name, (x, y, w, h) in sorted(rects.items())},
+    }
+    with open(os.path.splitext(output)[0] + ".json", "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+def parse_size(text):
+    """Parse WIDTHxHEIGHT"""
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Pixelate a directory of sprites into a packed texture atlas")
+    parser.add_argument("src_dir", help="directory containing sprite images")
+    parser.add_argument("-o", "--output", default="sprite_atlas.png", help="atlas image path (index is written next to it as .json)")
+    parser.add_argument("--size", type=parse_size, default=(125, 125), help="frame size WIDTHxHEIGHT (default 125x125)")
+    parser.add_argument("--pixel-size", type=int, default=3, help="pixel block size (default 3)")
+    parser.add_argument("--pattern", default="*.png", help="file glob (default *.png)")
+    parser.add_argument("--padding", type=int, default=1, help="pixels between frames (default 1)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    try:
+        index = bake(args.src_dir, args.output, args.size, args.pixel_size,
+                     args.workers, args.pattern, args.padding)
+    except ValueError as e:
+        print(f"Bake failed: {e}")
+        return 1
+    print(f"Baked {len(index['frames'])} frames into {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())